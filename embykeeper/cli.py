@@ -1,7 +1,14 @@
+import sys
+
+from . import profiling
+
+# 启动性能分析需要在导入其他模块前启用, 因此在解析命令行参数前直接检查
+if any(a == "--profile-startup" or a.startswith("--profile-startup=") for a in sys.argv[1:]):
+    profiling.enable()
+
 from pathlib import Path
 from datetime import datetime, timedelta
 import re
-import sys
 from typing import List
 import json
 
@@ -168,6 +175,14 @@ async def main(
         False, "--analyze", "-A", rich_help_panel="调试工具", help="仅启动历史信息分析"
     ),
     dump: List[str] = typer.Option([], "--dump", "-D", rich_help_panel="调试工具", help="仅启动更新日志"),
+    vacuum: bool = typer.Option(False, "--vacuum", rich_help_panel="调试工具", help="仅整理账号会话数据库"),
+    profile_startup: str = typer.Option(
+        Flagged("", "-"),
+        "--profile-startup",
+        rich_help_panel="调试工具",
+        show_default=False,
+        help="退出时输出启动性能分析, 可指定文件以写入记录",
+    ),
     top: bool = typer.Option(
         True, "--no-top", "-T", rich_help_panel="调试参数", help="执行过程中显示系统调试状态"
     ),
@@ -218,7 +233,11 @@ async def main(
         logger.warning(f"您当前处于调试模式: 日志等级 {verbosity}.")
         app.pretty_exceptions_enable = True
 
-    config: dict = await prepare_config(config, basedir=basedir, public=public, windows=windows)
+    if profile_startup and profile_startup != "-" and profiling.profiler:
+        profiling.profiler.trace_file = Path(profile_startup)
+
+    with profiling.phase("config"):
+        config: dict = await prepare_config(config, basedir=basedir, public=public, windows=windows)
 
     if verbosity >= 2:
         config["nofail"] = False
@@ -227,6 +246,22 @@ async def main(
     if debug_cron:
         logger.warning("您当前处于计划任务调试模式, 将在 10 秒后运行计划任务.")
 
+    if "ocr_workers" in config:
+        from .ocr import OCRService
+
+        OCRService.workers = config["ocr_workers"]
+
+    if "login_concurrent" in config:
+        from .telechecker.tele import ClientsSession
+
+        ClientsSession.login_concurrent = config["login_concurrent"]
+
+    if "auth_ttl" in config or "auth_fail_ttl" in config:
+        from .telechecker.link import AuthCache
+
+        AuthCache.ttl = config.get("auth_ttl", AuthCache.ttl)
+        AuthCache.fail_ttl = config.get("auth_fail_ttl", AuthCache.fail_ttl)
+
     default_time = config.get("time", "<8:00AM,10:00AM>")
     default_interval = config.get("interval", "<3,12>")
     logger.debug(f"采用默认签到时间范围 {default_time}, 默认保活间隔天数 {default_interval}.")
@@ -285,6 +320,11 @@ async def main(
 
         return await dumper(config, dump)
 
+    if vacuum:
+        from .telechecker.debug import vacuumer
+
+        return await vacuumer(config)
+
     if debug_notify:
         from .telechecker.notify import start_notifier
 
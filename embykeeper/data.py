@@ -8,6 +8,7 @@ import httpx
 from cachetools import TTLCache
 from loguru import logger
 
+from .http import borrow
 from .utils import format_byte_human, nonblocking, show_exception, to_iterable, get_proxy_str
 
 logger = logger.bind(scheme="datamanager")
@@ -26,7 +27,7 @@ async def refresh_version(connector):
     async with nonblocking(lock):
         for data_url in cdn_urls:
             url = f"{data_url}/version"
-            async with httpx.AsyncClient(http2=True, follow_redirects=True) as client:
+            async with borrow(follow_redirects=True) as client:
                 try:
                     resp = await client.get(url)
                     if resp.status_code == 200:
@@ -84,9 +85,7 @@ async def get_datas(basedir: Path, names: Union[Iterable[str], str], proxy: dict
                         url = f"{data_url}/data/{name}"
                         logger.debug(f"正在尝试 URL: {url}")
                         proxy_url = get_proxy_str(proxy) if proxy else None
-                        async with httpx.AsyncClient(
-                            http2=True, proxy=proxy_url, verify=False, follow_redirects=True
-                        ) as client:
+                        async with borrow(proxy=proxy_url, verify=False, follow_redirects=True) as client:
                             try:
                                 resp = await client.get(url)
                                 if resp.status_code == 200:
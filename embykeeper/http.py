@@ -0,0 +1,135 @@
+"""进程内共享的 httpx 客户端池, 相同配置的请求复用 TLS 会话和 HTTP/2 连接."""
+
+import asyncio
+from contextlib import asynccontextmanager
+from http.cookiejar import CookieJar
+import time
+from typing import Dict, Tuple
+
+import httpx
+from loguru import logger
+
+from .utils import show_exception
+
+
+class NoCookieJar(CookieJar):
+    """不保存响应设置的 Cookie, 避免共享客户端在不同账号的请求间泄露站点会话."""
+
+    def extract_cookies(self, response, request):
+        pass
+
+
+class HTTPClientEntry:
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.borrowers = 0
+        self.last_used = time.monotonic()
+
+
+class HTTPPool:
+    """
+    httpx 客户端池.
+    说明:
+        客户端以 (事件循环, 代理, 证书验证, HTTP/2, 跟随重定向, 请求头) 为键共享,
+        超过 idle_timeout 秒未使用且无人借用的客户端将被关闭.
+        共享客户端不保存 Cookie, 需要维持站点会话的请求应使用独立的客户端.
+    """
+
+    idle_timeout = 300
+    clients: Dict[Tuple, HTTPClientEntry] = {}
+    evictors: Dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+    created_count = 0  # 已创建的客户端数
+    borrow_count = 0  # 已借用的次数
+    evicted_count = 0  # 因闲置关闭的客户端数
+
+    @classmethod
+    def key(cls, proxy: str = None, verify=True, http2=True, follow_redirects=False, headers: dict = None):
+        headers = tuple(sorted(headers.items())) if headers else None
+        return (asyncio.get_running_loop(), proxy, verify, http2, follow_redirects, headers)
+
+    @classmethod
+    @asynccontextmanager
+    async def borrow(
+        cls, proxy: str = None, verify=True, http2=True, follow_redirects=False, headers: dict = None
+    ):
+        """
+        借用一个共享的客户端, 使用期间不会被关闭.
+        参数:
+            proxy: 代理字符串, 由 get_proxy_str 生成
+            verify: 是否验证证书
+            http2: 是否启用 HTTP/2
+            follow_redirects: 是否跟随重定向
+            headers: 客户端默认请求头
+        """
+        key = cls.key(proxy, verify, http2, follow_redirects, headers)
+        entry = cls.clients.get(key, None)
+        if not entry or entry.client.is_closed:
+            client = httpx.AsyncClient(
+                http2=http2,
+                proxy=proxy,
+                verify=verify,
+                follow_redirects=follow_redirects,
+                headers=headers,
+                cookies=NoCookieJar(),
+            )
+            entry = cls.clients[key] = HTTPClientEntry(client)
+            cls.created_count += 1
+            cls.start_evictor()
+        cls.borrow_count += 1
+        entry.borrowers += 1
+        try:
+            yield entry.client
+        finally:
+            entry.borrowers -= 1
+            entry.last_used = time.monotonic()
+
+    @classmethod
+    def start_evictor(cls):
+        loop = asyncio.get_running_loop()
+        task = cls.evictors.get(loop, None)
+        if not task or task.done():
+            cls.evictors[loop] = loop.create_task(cls.evictor(loop))
+
+    @classmethod
+    async def evictor(cls, loop: asyncio.AbstractEventLoop):
+        """定时关闭闲置的客户端."""
+        while True:
+            await asyncio.sleep(min(60, cls.idle_timeout))
+            now = time.monotonic()
+            for key, entry in list(cls.clients.items()):
+                if key[0] is not loop or entry.borrowers:
+                    continue
+                if now - entry.last_used > cls.idle_timeout:
+                    cls.clients.pop(key, None)
+                    cls.evicted_count += 1
+                    try:
+                        await entry.client.aclose()
+                    except Exception as e:
+                        logger.debug("关闭闲置的 HTTP 客户端时发生错误.")
+                        show_exception(e, regular=False)
+
+    @classmethod
+    async def close(cls):
+        """关闭当前事件循环中的所有客户端."""
+        loop = asyncio.get_running_loop()
+        task = cls.evictors.pop(loop, None)
+        if task:
+            task.cancel()
+        for key, entry in list(cls.clients.items()):
+            if key[0] is loop:
+                cls.clients.pop(key, None)
+                await entry.client.aclose()
+
+    @classmethod
+    def connections(cls):
+        """当前打开的连接数."""
+        count = 0
+        for entry in cls.clients.values():
+            transports = [entry.client._transport, *entry.client._mounts.values()]
+            for transport in transports:
+                pool = getattr(transport, "_pool", None)
+                count += len(getattr(pool, "connections", []))
+        return count
+
+
+borrow = HTTPPool.borrow
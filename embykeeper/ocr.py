@@ -1,11 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
-from typing import Optional, Union
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
 from io import BytesIO
 from multiprocessing import Process, Queue
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
 import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
 import time
 import uuid
 
+from cachetools import TTLCache
+
 from .data import get_datas
 
 
@@ -20,11 +30,184 @@ class CharRange(IntEnum):
     NOT_NUMBER_LLETTER_ULETTER = 7
 
 
+class OCRWorker:
+    """OCR 工作进程及其请求队列"""
+
+    def __init__(self, process: Process, queue_in: Queue):
+        self.process = process
+        self.queue_in = queue_in  # 发送图片数据的队列
+        self.requests = set()  # 正在处理的请求 ID
+
+    @property
+    def load(self):
+        return len(self.requests)
+
+
+class ImageSlots:
+    """共享内存图片槽位, 图片数据写入槽位后仅需向工作进程传递槽位名称, 避免序列化和复制"""
+
+    def __init__(self, count: int, size: int):
+        self.count = count
+        self.size = size
+        self.blocks: List[SharedMemory] = []
+        self.free: List[int] = []
+        if os.name != "nt":
+            # 在启动工作进程前启动共享的资源追踪进程, 以免工作进程退出时清理仍在使用的槽位
+            from multiprocessing import resource_tracker
+
+            resource_tracker.ensure_running()
+
+    def acquire(self, data: bytes):
+        """将图片写入空闲槽位并返回槽位序号, 图片过大或无空闲槽位时返回 None"""
+        if len(data) > self.size:
+            return None
+        if self.free:
+            slot = self.free.pop()
+        elif len(self.blocks) < self.count:
+            self.blocks.append(SharedMemory(create=True, size=self.size))
+            slot = len(self.blocks) - 1
+        else:
+            return None
+        self.blocks[slot].buf[: len(data)] = data
+        return slot
+
+    def name(self, slot: int):
+        return self.blocks[slot].name
+
+    def release(self, slot: int):
+        self.free.append(slot)
+
+    def close(self):
+        for b in self.blocks:
+            b.close()
+            try:
+                b.unlink()
+            except FileNotFoundError:
+                pass
+        self.blocks.clear()
+        self.free.clear()
+
+
+class OCRCache:
+    """
+    OCR 识别结果缓存.
+    说明:
+        以图片内容哈希和模型配置为键, 内存中的 LRU 缓存之后为工作目录中的持久化存储.
+        持久化存储的读写在专用线程中执行, 过期结果在打开时清理.
+    """
+
+    DATABASE = "ocr_cache.db"
+
+    _caches = {}  # basedir: OCRCache
+
+    hits = 0  # 缓存命中数
+    misses = 0  # 缓存未命中数
+
+    @classmethod
+    def of(cls, basedir: str = None):
+        """获取工作目录对应的缓存实例"""
+        cache = cls._caches.get(basedir, None)
+        if not cache:
+            cache = cls._caches[basedir] = cls(basedir)
+        return cache
+
+    def __init__(self, basedir: str = None, maxsize: int = 1024, ttl: int = 7 * 86400):
+        self.ttl = ttl
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.database = Path(basedir) / self.DATABASE if basedir else None
+        self.conn: sqlite3.Connection = None
+        self.executor: ThreadPoolExecutor = None
+
+    @staticmethod
+    def key(image: bytes, ocr_name: str = None, char_range: Optional[Union[CharRange, str]] = None):
+        """计算缓存键"""
+        if isinstance(char_range, CharRange):
+            char_range = char_range.value
+        h = hashlib.sha256(image)
+        h.update(f"|{ocr_name or ''}|{'' if char_range is None else char_range}".encode())
+        return h.hexdigest()
+
+    async def _run(self, func, *args):
+        if not self.executor:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-cache")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _connect(self):
+        if not self.conn:
+            self.database.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(self.database), timeout=1, check_same_thread=False)
+            with self.conn:
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS results "
+                    "(key TEXT PRIMARY KEY, result TEXT NOT NULL, date INTEGER NOT NULL)"
+                )
+                self.conn.execute("DELETE FROM results WHERE date < ?", (int(time.time()) - self.ttl,))
+        return self.conn
+
+    def _get(self, key: str):
+        r = (
+            self._connect()
+            .execute(
+                "SELECT result FROM results WHERE key = ? AND date >= ?", (key, int(time.time()) - self.ttl)
+            )
+            .fetchone()
+        )
+        return r[0] if r else None
+
+    def _set(self, key: str, result: str):
+        with self._connect() as conn:
+            conn.execute(
+                "REPLACE INTO results (key, result, date) VALUES (?, ?, ?)", (key, result, int(time.time()))
+            )
+
+    async def get(self, key: str):
+        """读取缓存的识别结果, 不存在时返回 None"""
+        result = self.memory.get(key, None)
+        if result is None and self.database:
+            try:
+                result = await self._run(self._get, key)
+            except sqlite3.Error:
+                result = None
+            if result is not None:
+                self.memory[key] = result
+        if result is None:
+            OCRCache.misses += 1
+        else:
+            OCRCache.hits += 1
+        return result
+
+    async def set(self, key: str, result: str):
+        """写入识别结果"""
+        self.memory[key] = result
+        if self.database:
+            try:
+                await self._run(self._set, key, result)
+            except sqlite3.Error:
+                pass
+
+    async def close(self):
+        if not self.executor:
+            return
+        if self.conn:
+            await self._run(self.conn.close)
+            self.conn = None
+        self.executor.shutdown(wait=False)
+        self.executor = None
+
+
 class OCRService:
     # 添加类变量用于进程池
     _pool = {}
     _pool_lock = asyncio.Lock()
 
+    workers = 1  # 每个模型的最大工作进程数
+    batch_delay = 0.005  # 工作进程合并请求的等待时间
+    batch_size = 8  # 工作进程每批最多处理的请求数
+    slot_size = 1 << 20  # 共享内存图片槽位大小, 更大的图片将直接通过队列传递
+
+    processed_count = 0  # 已完成识别的请求数
+    wait_time = 0  # 请求在工作进程队列中等待时间的平滑值
+
     @classmethod
     async def get(
         cls,
@@ -43,6 +226,28 @@ class OCRService:
             cls._pool[key] = instance
             return instance
 
+    @classmethod
+    async def preload(
+        cls,
+        specs: Iterable[Tuple[Optional[str], Optional[Union[CharRange, str]]]],
+        basedir: str = None,
+        proxy: dict = None,
+    ) -> List["OCRService"]:
+        """预先启动指定模型 (ocr_name, char_range) 的工作进程, 并保持运行直到调用 release"""
+        services = []
+        for ocr_name, char_range in specs:
+            service = await cls.get(ocr_name, char_range, basedir, proxy)
+            service.subscribe()
+            await service.start()
+            services.append(service)
+        return services
+
+    @staticmethod
+    def release(services: List["OCRService"]):
+        """释放预先启动的工作进程, 空闲超时后将被关闭"""
+        for service in services:
+            service.unsubscribe()
+
     def __init__(
         self,
         ocr_name: str = None,
@@ -55,40 +260,81 @@ class OCRService:
         self.basedir = basedir
         self.proxy = proxy
 
-        self._process = None
-        self._queue_in = None  # 发送图片数据的队列
-        self._queue_out = None  # 接收识别结果的队列
+        self._workers: List[OCRWorker] = []
+        self._queue_out = None  # 接收识别结果的队列, 所有工作进程共用
         self._subscribers = 0
         self._last_active = time.time()
         self._stop_event = None
         self._monitor_task = None
+        self._reader_thread = None  # 阻塞读取识别结果的线程
         self._pending_requests = {}  # 存储待处理的请求
+        self._slots: ImageSlots = None
+        self._slot_requests = {}  # 请求 ID: 占用的图片槽位
+        self._cache = OCRCache.of(basedir)
+
+    @property
+    def _process(self):
+        """首个存活的工作进程"""
+        for w in self._workers:
+            if w.process.is_alive():
+                return w.process
 
     async def start(self):
         """启动OCR进程"""
-        if self._process and self._process.is_alive():
+        if self._process:
             return
+        if self._workers or self._monitor_task or self._queue_out:
+            # 所有工作进程已退出但尚未被监控任务清理, 先释放残留的队列, 槽位和线程
+            await self.force_stop()
 
-        self._queue_in = Queue()
         self._queue_out = Queue()
         self._stop_event = asyncio.Event()
+        self._slots = ImageSlots(self.workers * self.batch_size, self.slot_size)
+        self._spawn()
+
+        # 启动结果读取线程, 结果到达后立即通过事件循环回调交付
+        self._reader_thread = threading.Thread(
+            target=self._reader,
+            args=(self._queue_out, asyncio.get_running_loop()),
+            name=f"ocr-reader-{self.ocr_name or 'default'}",
+            daemon=True,
+        )
+        self._reader_thread.start()
+
+        # 启动监控任务
+        self._monitor_task = asyncio.create_task(self._monitor())
 
-        self._process = Process(
+    def _spawn(self):
+        """启动一个新的工作进程"""
+        queue_in = Queue()
+        process = Process(
             target=self._process_main,
             args=(
-                self._queue_in,
+                queue_in,
                 self._queue_out,
                 self.ocr_name,
                 self.char_range,
                 self.basedir,
                 self.proxy,
+                self.batch_delay,
+                self.batch_size,
             ),
             daemon=True,
         )
-        self._process.start()
-
-        # 启动监控任务
-        self._monitor_task = asyncio.create_task(self._monitor())
+        process.start()
+        worker = OCRWorker(process, queue_in)
+        self._workers.append(worker)
+        return worker
+
+    def _select(self):
+        """选择负载最低的存活工作进程, 所有进程均繁忙且未达上限时启动新进程"""
+        alive = [w for w in self._workers if w.process.is_alive()]
+        if not alive:
+            return self._spawn()
+        worker = min(alive, key=lambda w: w.load)
+        if worker.load and len(alive) < self.workers:
+            worker = self._spawn()
+        return worker
 
     async def stop(self, force: bool = False):
         """停止OCR进程"""
@@ -99,12 +345,13 @@ class OCRService:
 
     async def force_stop(self):
         """强制停止OCR进程"""
-        if self._monitor_task:
+        if self._monitor_task and self._monitor_task is not asyncio.current_task():
             self._monitor_task.cancel()
             try:
                 await self._monitor_task
             except asyncio.CancelledError:
                 pass
+        self._monitor_task = None
 
         # 处理所有未完成的请求
         for future in self._pending_requests.values():
@@ -112,21 +359,44 @@ class OCRService:
                 future.set_exception(Exception("OCR进程已停止"))
         self._pending_requests.clear()
 
-        if self._process and self._process.is_alive():
-            self._queue_in.put(("stop", None))
-            self._process.join(timeout=1)
-            if self._process.is_alive():
-                self._process.terminate()
-                self._process.join()
-
-        self._process = None
-        self._queue_in = None
+        for w in self._workers:
+            if w.process.is_alive():
+                w.queue_in.put(("stop", None))
+        for w in self._workers:
+            w.process.join(timeout=1)
+            if w.process.is_alive():
+                w.process.terminate()
+                w.process.join()
+
+        if self._queue_out:
+            self._queue_out.put(None)  # 通知结果读取线程退出
+        self._reader_thread = None
+
+        if self._slots:
+            self._slots.close()
+            self._slots = None
+        self._slot_requests.clear()
+
+        self._workers = []
         self._queue_out = None
         self._stop_event = None
 
     async def run(self, image_data: BytesIO, timeout: int = 60) -> str:
+        """发送图片到OCR进程并等待结果, 相同图片的结果将从缓存中读取"""
+        cache_key = OCRCache.key(image_data.getbuffer(), self.ocr_name, self.char_range)
+        result = await self._cache.get(cache_key)
+        if result is not None:
+            self._last_active = time.time()
+            return result
+
+        result = await self._recognize(image_data, timeout)
+        if result:
+            await self._cache.set(cache_key, result)
+        return result
+
+    async def _recognize(self, image_data: BytesIO, timeout: int = 60) -> str:
         """发送图片到OCR进程并等待结果"""
-        if not self._process or not self._process.is_alive():
+        if not self._process:
             await self.start()
 
         # 生成唯一请求ID
@@ -134,12 +404,24 @@ class OCRService:
         future = asyncio.Future()
         self._pending_requests[request_id] = future
 
+        worker = self._select()
+        worker.requests.add(request_id)
         try:
             self._last_active = time.time()
-            self._queue_in.put(("process", (request_id, image_data.getvalue())))
+            image = image_data.getbuffer()
+            slot = self._slots.acquire(image)
+            if slot is None:
+                payload = image_data.getvalue()
+            else:
+                # 槽位在收到该请求的结果后才释放, 以免超时后被重用时工作进程仍在读取
+                self._slot_requests[request_id] = slot
+                payload = (self._slots.name(slot), len(image))
+            del image
+            worker.queue_in.put(("process", (request_id, payload, time.time())))
             result = await asyncio.wait_for(future, timeout=timeout)
             return result
         finally:
+            worker.requests.discard(request_id)
             self._pending_requests.pop(request_id, None)
 
     def subscribe(self):
@@ -152,8 +434,50 @@ class OCRService:
         self._subscribers = max(0, self._subscribers - 1)
         self._last_active = time.time()
 
+    def _reader(self, queue_out: Queue, loop: asyncio.AbstractEventLoop):
+        """在线程中阻塞读取结果队列, 并将结果交付到事件循环"""
+        while True:
+            try:
+                items = queue_out.get()
+            except (EOFError, OSError):
+                break
+            if items is None:
+                break
+            try:
+                loop.call_soon_threadsafe(self._deliver, items)
+            except RuntimeError:  # 事件循环已关闭
+                break
+
+    def _release(self, request_id: str):
+        """释放请求占用的图片槽位"""
+        slot = self._slot_requests.pop(request_id, None)
+        if slot is not None and self._slots:
+            self._slots.release(slot)
+
+    def _deliver(self, items: list):
+        """找到对应的 future 并设置结果"""
+        for status, data in items:
+            if isinstance(data, str):
+                # 模型加载失败, 所有等待中的请求均无法完成
+                for future in self._pending_requests.values():
+                    if not future.done():
+                        future.set_exception(Exception(data))
+                continue
+            request_id, result, wait = data
+            self._release(request_id)
+            cls = self.__class__
+            cls.processed_count += 1
+            cls.wait_time = wait if cls.processed_count == 1 else 0.8 * cls.wait_time + 0.2 * wait
+            future = self._pending_requests.get(request_id, None)
+            if not future or future.done():
+                continue
+            if status == "error":
+                future.set_exception(Exception(result))
+            else:
+                future.set_result(result)
+
     async def _monitor(self):
-        """监控进程状态和空闲时间，同时处理返回结果"""
+        """监控进程状态和空闲时间"""
         while True:
             try:
                 # 检查进程状态和空闲超时
@@ -161,27 +485,20 @@ class OCRService:
                     await self.force_stop()
                     break
 
-                if self._process and not self._process.is_alive():
+                # 移除已退出的工作进程, 并使其上的请求失败
+                for w in [w for w in self._workers if not w.process.is_alive()]:
+                    self._workers.remove(w)
+                    for request_id in w.requests:
+                        self._release(request_id)
+                        future = self._pending_requests.get(request_id, None)
+                        if future and not future.done():
+                            future.set_exception(Exception("OCR进程已停止"))
+
+                if not self._workers:
                     await self.force_stop()
                     break
 
-                # 非阻塞方式检查结果队列
-                try:
-                    status, (request_id, result) = await asyncio.get_event_loop().run_in_executor(
-                        None, self._queue_out.get_nowait
-                    )
-
-                    # 找到对应的future并设置结果
-                    if request_id in self._pending_requests:
-                        future = self._pending_requests[request_id]
-                        if status == "error":
-                            future.set_exception(Exception(result))
-                        else:
-                            future.set_result(result)
-                except (asyncio.CancelledError, Exception):
-                    pass
-
-                await asyncio.sleep(0.1)  # 短暂休眠避免CPU占用过高
+                await asyncio.sleep(5)
 
             except asyncio.CancelledError:
                 break
@@ -198,9 +515,12 @@ class OCRService:
         char_range: Optional[Union[CharRange, str]],
         basedir: str,
         proxy: dict,
+        batch_delay: float = 0,
+        batch_size: int = 1,
     ):
         model = None
         use_probability = False
+        slots = {}  # 已连接的共享内存图片槽位
 
         try:
             from ddddocr import DdddOcr
@@ -218,39 +538,67 @@ class OCRService:
                 files = (f"{ocr_name}.onnx", f"{ocr_name}.json")
                 async for p in get_datas(basedir, files, proxy=proxy, caller="OCR"):
                     if p is None:
-                        queue_out.put(("error", "无法下载所需文件"))
+                        queue_out.put([("error", "无法下载所需文件")])
                         return
                     data.append(p)
                 try:
                     model = DdddOcr(show_ad=False, import_onnx_path=str(data[0]), charsets_path=str(data[1]))
                 except InvalidProtobuf:
-                    queue_out.put(("error", "文件下载不完全"))
+                    queue_out.put([("error", "文件下载不完全")])
                     return
 
             # 处理请求循环
             while True:
                 try:
-                    cmd, data = queue_in.get()
+                    batch = [queue_in.get()]
+                    # 合并短时间内到达的请求, 批量处理并一次性返回结果
+                    deadline = time.monotonic() + batch_delay
+                    while len(batch) < batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        try:
+                            batch.append(queue_in.get(timeout=remaining))
+                        except Empty:
+                            break
                 except KeyboardInterrupt:
                     break
-                if cmd == "stop":
-                    break
 
-                request_id, image_data = data
-                try:
-                    image = Image.open(BytesIO(image_data))
-                    if use_probability:
-                        ocr_result = model.classification(image, probability=True)
-                        ocr_text = ""
-                        for i in ocr_result["probability"]:
-                            ocr_text += ocr_result["charsets"][i.index(max(i))]
-                    else:
-                        ocr_text = model.classification(image)
-                    queue_out.put(("success", (request_id, ocr_text)))
-                except Exception as e:
-                    queue_out.put(("error", (request_id, str(e))))
+                results = []
+                stop = False
+                for cmd, data in batch:
+                    if cmd == "stop":
+                        stop = True
+                        continue
+
+                    request_id, payload, submitted = data
+                    wait = time.time() - submitted
+                    try:
+                        if isinstance(payload, bytes):
+                            image = Image.open(BytesIO(payload))
+                        else:
+                            name, size = payload
+                            if name not in slots:
+                                slots[name] = SharedMemory(name=name)
+                            image = Image.open(BytesIO(slots[name].buf[:size]))
+                        if use_probability:
+                            ocr_result = model.classification(image, probability=True)
+                            ocr_text = ""
+                            for i in ocr_result["probability"]:
+                                ocr_text += ocr_result["charsets"][i.index(max(i))]
+                        else:
+                            ocr_text = model.classification(image)
+                        results.append(("success", (request_id, ocr_text, wait)))
+                    except Exception as e:
+                        results.append(("error", (request_id, str(e), wait)))
+                if results:
+                    queue_out.put(results)
+                if stop:
+                    break
 
         finally:
+            for shm in slots.values():
+                shm.close()
             if model:
                 del model
 
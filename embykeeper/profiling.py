@@ -0,0 +1,173 @@
+"""启动性能分析, 记录模块导入耗时, 各阶段耗时和内存峰值, 由 --profile-startup 启用."""
+
+import atexit
+from contextlib import contextmanager, nullcontext
+from importlib.abc import MetaPathFinder
+import json
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+
+profiler: "StartupProfiler" = None
+
+
+class ImportTimer(MetaPathFinder):
+    """计时模块导入的元路径查找器, 包装其他查找器返回的加载器."""
+
+    def __init__(self, profiler: "StartupProfiler"):
+        self.profiler = profiler
+        self.local = threading.local()
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            find_spec = getattr(finder, "find_spec", None)
+            if not find_spec:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # 内置和冻结模块的加载器为类本身, 不进行包装
+        if loader is None or isinstance(loader, type) or not hasattr(loader, "exec_module"):
+            return spec
+        # 同一加载器可能被多个模块共用 (如 PyInstaller 的冻结导入器), 仅包装一次, 模块名从被执行的模块获取
+        if not getattr(loader.exec_module, "timed", False):
+            loader.exec_module = self.wrap(loader.exec_module)
+        return spec
+
+    def wrap(self, exec_module):
+        def timed_exec_module(module):
+            fullname = module.__name__
+            stack = self.local.__dict__.setdefault("stack", [])
+            start = time.perf_counter()
+            stack.append(0.0)
+            try:
+                return exec_module(module)
+            finally:
+                total = time.perf_counter() - start
+                children = stack.pop()
+                if stack:
+                    stack[-1] += total
+                self.profiler.imports.append((fullname, start - self.profiler.start, total, total - children))
+
+        timed_exec_module.timed = True
+        return timed_exec_module
+
+
+class StartupProfiler:
+    """启动性能分析器."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.imports = []  # (module, start, total, self)
+        self.phases = []  # (name, start, duration)
+        self.trace_file: Path = None
+        self.finder = ImportTimer(self)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start - self.start, time.perf_counter() - start))
+
+    @staticmethod
+    def peak_rss():
+        """获取进程内存峰值 (字节)."""
+        try:
+            import resource
+
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+        except ImportError:
+            import psutil
+
+            info = psutil.Process().memory_info()
+            return getattr(info, "peak_wset", info.rss)
+
+    def trace(self):
+        """生成 Chrome Trace 格式的记录, 可在 chrome://tracing 或 Perfetto 中查看."""
+        events = []
+        pid = os.getpid()
+        for module, start, total, _ in self.imports:
+            events.append(
+                {
+                    "name": module,
+                    "cat": "import",
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": total * 1e6,
+                    "pid": pid,
+                    "tid": 0,
+                }
+            )
+        for name, start, duration in self.phases:
+            events.append(
+                {
+                    "name": name,
+                    "cat": "phase",
+                    "ph": "X",
+                    "ts": start * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": pid,
+                    "tid": 1,
+                }
+            )
+        return {
+            "traceEvents": events,
+            "otherData": {"elapsed": time.perf_counter() - self.start, "peak_rss": self.peak_rss()},
+        }
+
+    def report(self, limit: int = 20):
+        """输出按耗时排序的分析报告, 并写入记录文件."""
+        from rich.table import Table
+
+        from .var import console
+
+        elapsed = time.perf_counter() - self.start
+        peak = self.peak_rss() / 1024 / 1024
+        console.rule(f"启动性能分析: 运行 {elapsed:.2f} 秒, 内存峰值 {peak:.1f} MB")
+
+        table = Table("模块", "自身耗时 (ms)", "累计耗时 (ms)", title=f"模块导入 (共 {len(self.imports)} 个)")
+        for module, _, total, own in sorted(self.imports, key=lambda i: i[3], reverse=True)[:limit]:
+            table.add_row(module, f"{own * 1000:.1f}", f"{total * 1000:.1f}")
+        console.print(table)
+
+        table = Table("阶段", "开始 (s)", "耗时 (ms)", title="启动阶段")
+        for name, start, duration in sorted(self.phases, key=lambda p: p[2], reverse=True):
+            table.add_row(name, f"{start:.2f}", f"{duration * 1000:.1f}")
+        console.print(table)
+
+        if self.trace_file:
+            try:
+                with open(self.trace_file, "w", encoding="utf-8") as f:
+                    json.dump(self.trace(), f, ensure_ascii=False)
+                console.print(f"启动性能记录已写入: {self.trace_file}")
+            except OSError as e:
+                console.print(f"启动性能记录写入失败: {e}")
+
+
+def enable():
+    """启用启动性能分析, 应在导入其他模块前调用."""
+    global profiler
+    if profiler:
+        return profiler
+    profiler = StartupProfiler()
+    sys.meta_path.insert(0, profiler.finder)
+    atexit.register(profiler.report)
+    return profiler
+
+
+def phase(name: str):
+    """记录一个启动阶段的耗时, 未启用分析时不做任何操作."""
+    if profiler:
+        return profiler.phase(name)
+    else:
+        return nullcontext()
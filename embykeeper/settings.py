@@ -39,6 +39,13 @@ def check_config(config):
             Optional("concurrent"): PositiveInt(),
             Optional("watch_concurrent"): int,
             Optional("listen_concurrent"): int,
+            Optional("dispatch_shards"): And(int, lambda n: n >= 0),
+            Optional("shared_session"): bool,
+            Optional("login_concurrent"): PositiveInt(),
+            Optional("ocr_workers"): PositiveInt(),
+            Optional("ocr_preload"): bool,
+            Optional("auth_ttl"): And(int, lambda n: n >= 0),
+            Optional("auth_fail_ttl"): And(int, lambda n: n >= 0),
             Optional("random"): PositiveInt(),
             Optional("notifier"): Or(str, bool, int),
             Optional("notify_immediately"): bool,
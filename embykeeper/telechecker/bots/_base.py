@@ -27,12 +27,13 @@ from pyrogram.raw.functions.account import GetNotifySettings
 from pyrogram.raw.types import PeerNotifySettings, InputNotifyPeer
 from thefuzz import fuzz, process
 
-from embykeeper import __name__ as __product__
+from embykeeper import __name__ as __product__, profiling
 from embykeeper.ocr import CharRange, OCRService
 from embykeeper.utils import show_exception, to_iterable, format_timedelta_human, AsyncCountPool
 
 from ..lock import ocrs, ocrs_lock
 from ..tele import Client
+from ..keywords import KeywordMatcher
 from ..link import Link
 
 __ignore__ = True
@@ -206,8 +207,9 @@ class BotCheckin(BaseBotCheckin):
         """执行监控上下文."""
         group = await self.group_pool.append(self)
         handlers = self.get_handlers()
-        for h in handlers:
-            await self.client.add_handler(h, group=group)
+        with profiling.phase(f"handlers {self.name}"):
+            for h in handlers:
+                await self.client.add_handler(h, group=group)
         yield
         for h in handlers:
             try:
@@ -260,19 +262,11 @@ class BotCheckin(BaseBotCheckin):
             else:
                 break
 
-        _is_archived = False
-        async for d in self.client.get_dialogs(folder_id=1):
-            if d.chat.id == chat.id:
-                _is_archived = True
-                break
-        else:
-            async for d in self.client.get_dialogs(folder_id=0):
-                if d.chat.id == chat.id:
-                    break
-            else:
-                if not self.bot_allow_from_scratch:
-                    self.log.debug(f'跳过签到: 从未与 "{ident}" 交流.')
-                    return CheckinResult.IGNORE
+        dialog = await self.client.dialog_index.get(chat.id)
+        if not dialog and not self.bot_allow_from_scratch:
+            self.log.debug(f'跳过签到: 从未与 "{ident}" 交流.')
+            return CheckinResult.IGNORE
+        _is_archived = bool(dialog and dialog.archived)
 
         while True:
             if self.additional_auth:
@@ -508,32 +502,44 @@ class BotCheckin(BaseBotCheckin):
         """
         await message.reply(captcha)
 
+    @classmethod
+    def get_keyword_matcher(cls):
+        """获取用于签到回复分类的关键词匹配器, 每个站点类仅构建一次."""
+        matcher = cls.__dict__.get("_keyword_matcher", None)
+        if not matcher:
+            matcher = KeywordMatcher(
+                {
+                    "ignore": to_iterable(cls.bot_text_ignore),
+                    **{
+                        k: to_iterable(getattr(cls, f"bot_{k}_keywords")) or default_keywords[k]
+                        for k in ("account_fail", "too_many_tries_fail", "checked", "fail", "success")
+                    },
+                }
+            )
+            cls._keyword_matcher = matcher
+        return matcher
+
     async def on_text(self, message: Message, text: str):
         """接收非验证码消息时, 检测关键词并确认签到成功或失败, 发送用户提示."""
         if not text:
             return
-        if any(s in text for s in to_iterable(self.bot_text_ignore)):
+        category = self.get_keyword_matcher().classify(text)
+        if category == "ignore":
             pass
-        elif any(
-            s in text for s in to_iterable(self.bot_account_fail_keywords) or default_keywords["account_fail"]
-        ):
+        elif category == "account_fail":
             self.log.warning(f"签到失败: 账户错误.")
             await self.fail()
-        elif any(
-            s in text
-            for s in to_iterable(self.bot_too_many_tries_fail_keywords)
-            or default_keywords["too_many_tries_fail"]
-        ):
+        elif category == "too_many_tries_fail":
             self.log.warning(f"签到失败: 尝试次数过多.")
             await self.fail()
-        elif any(s in text for s in to_iterable(self.bot_checked_keywords) or default_keywords["checked"]):
+        elif category == "checked":
             self.log.info(f"今日已经签到过了.")
             self._checked = True
             self.finished.set()
-        elif any(s in text for s in to_iterable(self.bot_fail_keywords) or default_keywords["fail"]):
+        elif category == "fail":
             self.log.info(f"签到失败: 验证码错误或网络错误, 正在重试.")
             await self.retry()
-        elif any(s in text for s in to_iterable(self.bot_success_keywords) or default_keywords["success"]):
+        elif category == "success":
             if await self.before_success():
                 if self.bot_success_pat:
                     matches = re.search(self.bot_success_pat, text)
@@ -9,6 +9,7 @@ from pyrogram.raw.functions.messages import RequestWebView
 from faker import Faker
 import httpx
 
+from embykeeper.http import borrow
 from embykeeper.utils import show_exception, truncate_str, get_proxy_str
 
 from ..link import Link
@@ -132,7 +133,7 @@ class FutureCheckin(BotCheckin):
             }
             for i in range(10):
                 try:
-                    async with httpx.AsyncClient(http2=True, proxy=get_proxy_str(self.proxy)) as client:
+                    async with borrow(proxy=get_proxy_str(self.proxy)) as client:
                         resp = await client.post(url_submit, headers=headers, data=data)
                         result = resp.text
                         if "完成" in result:
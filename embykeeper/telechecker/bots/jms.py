@@ -1,9 +1,9 @@
-import httpx
 from pyrogram.types import Message
 from pyrogram.raw.functions.messages import AcceptUrlAuth
 from pyrogram.raw.types import UrlAuthResultAccepted
 from faker import Faker
 
+from embykeeper.http import borrow
 from embykeeper.utils import get_proxy_str
 
 from ._base import BotCheckin
@@ -31,7 +31,7 @@ class JMSCheckin(BotCheckin):
                     )
                     url = r.url
                     for _ in range(1, 3):
-                        async with httpx.AsyncClient(http2=True, proxies=get_proxy_str(self.proxy)) as client:
+                        async with borrow(proxy=get_proxy_str(self.proxy)) as client:
                             resp = await client.get(url, headers={"User-Agent": Faker().safari()})
                             if resp.status_code == 200:
                                 return
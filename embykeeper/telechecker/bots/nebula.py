@@ -7,6 +7,7 @@ from pyrogram.raw.functions.messages import RequestWebView
 from pyrogram.raw.functions.users import GetFullUser
 from faker import Faker
 
+from embykeeper.http import borrow
 from embykeeper.utils import remove_prefix, get_proxy_str
 
 from ..link import Link
@@ -77,7 +78,7 @@ class NebulaCheckin(BaseBotCheckin):
         url_checkin = scheme._replace(query=urlencode(query, True)).geturl()
         proxy = get_proxy_str(self.proxy)
         try:
-            async with httpx.AsyncClient(http2=True, proxy=proxy) as client:
+            async with borrow(proxy=proxy) as client:
                 resp = await client.get(url_checkin, headers={"User-Agent": useragent})
                 results = resp.json()
                 message = results["message"]
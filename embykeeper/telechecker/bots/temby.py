@@ -10,6 +10,7 @@ from pyrogram.raw.types.messages import BotApp as MessageBotApp
 from faker import Faker
 import httpx
 
+from embykeeper.http import borrow
 from embykeeper.utils import get_proxy_str
 
 from ..link import Link
@@ -82,7 +83,7 @@ class TembyCheckin(BotCheckin):
                 "cf-turnstile-response": token,
             }
             try:
-                async with httpx.AsyncClient(http2=True, proxy=get_proxy_str(self.proxy)) as client:
+                async with borrow(proxy=get_proxy_str(self.proxy)) as client:
                     resp = await client.get(url_submit, headers=headers, params=params)
                     result = resp.text
                     if "好像还没有通过验证" in result:
@@ -1,5 +1,7 @@
 import asyncio
 import operator
+from pathlib import Path
+import sqlite3
 
 import aiofiles
 import yaml
@@ -19,8 +21,8 @@ from rich.panel import Panel
 from rich.table import Column, Table
 from rich.text import Text
 
-from ..utils import async_partial, batch, flatten, idle, time_in_range
-from .tele import Client, ClientsSession
+from ..utils import async_partial, batch, flatten, format_byte_human, idle, time_in_range
+from .tele import Client, ClientsSession, FileStorage, SharedFileStorage
 
 log = logger.bind(scheme="debugtool")
 
@@ -282,3 +284,45 @@ async def analyzer(config: dict, chats, keywords, timerange, limit=10000, output
                     allow_unicode=True,
                     Dumper=IndentDumper,
                 )
+
+
+async def vacuumer(config: dict):
+    """会话数据库整理工具, 整理工作目录中所有账号的会话数据库."""
+
+    def vacuum_shared(database: Path):
+        conn = sqlite3.connect(str(database), timeout=1)
+        try:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            conn.close()
+
+    basedir = Path(config["basedir"])
+    files = sorted(basedir.glob(f"*{FileStorage.FILE_EXTENSION}"))
+    shared = basedir / SharedFileStorage.DATABASE
+    if shared.is_file():
+        files.append(shared)
+    if not files:
+        log.info("工作目录中没有会话数据库.")
+        return
+    loop = asyncio.get_running_loop()
+    for f in files:
+        before = f.stat().st_size
+        if f == shared:
+            try:
+                await loop.run_in_executor(None, vacuum_shared, f)
+            except sqlite3.Error as e:
+                log.warning(f'整理会话数据库 "{f.name}" 失败: {e}.')
+                continue
+        else:
+            storage = FileStorage(f.stem, basedir)
+            try:
+                await storage.open()
+                await storage.vacuum()
+            except sqlite3.Error as e:
+                log.warning(f'整理会话数据库 "{f.name}" 失败: {e}.')
+                continue
+            finally:
+                await storage.close()
+        after = f.stat().st_size
+        log.info(f'整理会话数据库 "{f.name}": {format_byte_human(before)} -> {format_byte_human(after)}.')
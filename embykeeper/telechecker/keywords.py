@@ -0,0 +1,89 @@
+"""关键词匹配引擎, 用于签到回复分类和监控消息匹配."""
+
+from collections import deque
+from functools import lru_cache
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class KeywordMatcher:
+    """
+    Aho-Corasick 多模式字面关键词匹配器.
+    说明:
+        关键词按类别构建为一个自动机, 并展开为确定性状态转移表, 对文本扫描一次即可得到所有命中的类别.
+        类别的优先级为传入时的顺序, 命中的类别以位掩码表示, 低位优先.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]]):
+        self.order = list(keywords)
+        goto: List[Dict[str, int]] = [{}]
+        out: List[int] = [0]
+        for i, words in enumerate(keywords.values()):
+            for word in words:
+                if not word:
+                    continue
+                node = 0
+                for ch in word:
+                    nxt = goto[node].get(ch, None)
+                    if nxt is None:
+                        nxt = goto[node][ch] = len(goto)
+                        goto.append({})
+                        out.append(0)
+                    node = nxt
+                out[node] |= 1 << i
+        self.delta, self.out = self._build(goto, out)
+
+    @staticmethod
+    def _build(goto: List[Dict[str, int]], out: List[int]):
+        """计算失败指针, 并将其合并到各状态的转移表中."""
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            # 广度优先遍历保证失败状态的转移表已计算完成
+            delta[node] = {**delta[fail[node]], **goto[node]}
+            out[node] |= out[fail[node]]
+            for ch, nxt in goto[node].items():
+                fail[nxt] = delta[fail[node]].get(ch, 0) if node else 0
+                queue.append(nxt)
+        return delta, out
+
+    def mask(self, text: str) -> int:
+        """获取文本命中的类别位掩码, 命中最高优先级类别时提前结束."""
+        delta, out = self.delta, self.out
+        found = 0
+        node = 0
+        for ch in text:
+            node = delta[node].get(ch, 0)
+            if out[node]:
+                found |= out[node]
+                if found & 1:
+                    break
+        return found
+
+    def categories(self, text: str) -> Set[str]:
+        """获取文本命中的所有类别."""
+        found = 0
+        delta, out = self.delta, self.out
+        node = 0
+        for ch in text:
+            node = delta[node].get(ch, 0)
+            found |= out[node]
+        return {c for i, c in enumerate(self.order) if found >> i & 1}
+
+    def classify(self, text: str) -> Optional[str]:
+        """获取文本命中的优先级最高的类别, 未命中时返回 None."""
+        if not text:
+            return None
+        found = self.mask(text)
+        if not found:
+            return None
+        return self.order[(found & -found).bit_length() - 1]
+
+
+@lru_cache(maxsize=256)
+def compile_patterns(patterns: Tuple[str, ...], flags: int = 0):
+    """将一组正则表达式预编译为一个合并的正则表达式, 用于判断是否命中其中任意一个."""
+    return re.compile("|".join(f"(?:{p})" for p in patterns), flags)
@@ -1,6 +1,10 @@
 import asyncio
+import json
+import os
+from pathlib import Path
 import random
-from typing import Callable, Coroutine, List, Optional, Tuple, Union
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 import uuid
 from io import BytesIO
 
@@ -13,8 +17,8 @@ from pyrogram.types import Message
 from pyrogram.errors.exceptions.bad_request_400 import YouBlockedUser
 from pyrogram.errors import FloodWait
 
-from ..utils import async_partial, truncate_str
-from .lock import super_ad_shown, super_ad_shown_lock, authed_services, authed_services_lock
+from ..utils import truncate_str
+from .lock import super_ad_shown, super_ad_shown_lock, authed_services, authed_services_locks, authed_errors
 from .tele import Client
 
 
@@ -22,22 +26,113 @@ class LinkError(Exception):
     pass
 
 
-class Link:
-    """云服务类, 用于认证和高级权限任务通讯."""
+class LinkDeniedError(LinkError):
+    """服务端明确拒绝了请求."""
 
-    bot = "embykeeper_auth_bot"
-    post_count = 0
+    pass
+
+
+class AuthCache:
+    """
+    保存在工作目录中的服务认证结果缓存, 以账号, 服务和设备识别码为键.
+    说明:
+        认证通过和被拒绝的结果分别按 ttl 和 fail_ttl (秒) 过期, 设为 0 以禁用.
+    """
+
+    FILE = "auth_cache.json"
+    ttl = 43200
+    fail_ttl = 3600
+    _caches: Dict[Path, "AuthCache"] = {}
+
+    @classmethod
+    def of(cls, basedir: Path):
+        """获取工作目录对应的缓存, 无工作目录时返回 None."""
+        if not basedir:
+            return None
+        basedir = Path(basedir)
+        cache = cls._caches.get(basedir, None)
+        if not cache:
+            cache = cls._caches[basedir] = cls(basedir / cls.FILE)
+        return cache
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, dict] = None
+
+    def load(self):
+        if self.entries is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def get(self, key: str):
+        """获取未过期的认证结果 (result, errmsg), 不存在时返回 None."""
+        entry = self.load().get(key, None)
+        if not entry:
+            return None
+        ttl = self.ttl if entry["result"] else self.fail_ttl
+        if time.time() - entry["time"] > ttl:
+            return None
+        return entry["result"], entry.get("errmsg", None)
+
+    def set(self, key: str, result: bool, errmsg: str = None):
+        """保存认证结果, 并清理已过期的结果."""
+        if not (self.ttl if result else self.fail_ttl):
+            return
+        entries = self.load()
+        now = time.time()
+        entries[key] = {"result": result, "errmsg": errmsg, "time": now}
+        for k, e in list(entries.items()):
+            if now - e["time"] > max(self.ttl, self.fail_ttl):
+                del entries[k]
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.debug(f"认证缓存写入失败: {e}")
+
+
+class LinkChannel:
+    """
+    账号的云服务消息通道.
+    说明:
+        每个账号仅注册一个常驻处理器, 每条响应仅解析一次, 并按响应中回显的命令分发到等待的请求.
+    """
+
+    @classmethod
+    def of(cls, client: Client):
+        """获取账号的消息通道, 首次获取时注册处理器."""
+        channel: LinkChannel = getattr(client, "link_channel", None)
+        if not channel:
+            channel = client.link_channel = cls(client)
+            client.add_handler(channel.handler, group=1)
+        return channel
 
     def __init__(self, client: Client):
         self.client = client
         self.log = logger.bind(scheme="telelink", username=client.me.name)
-
-    @property
-    def instance(self):
-        """当前设备识别码."""
-        rd = random.Random()
-        rd.seed(uuid.getnode())
-        return uuid.UUID(int=rd.getrandbits(128))
+        self.waiters: Dict[str, List[Tuple[asyncio.Future, Callable]]] = {}  # cmd: [(future, condition)]
+        self.handler = MessageHandler(self._handler, filters.text & filters.bot & filters.user(Link.bot))
+
+    def wait(self, cmd: str, condition: Callable = None):
+        """登记一个等待响应的请求, 返回用于接收响应的 future."""
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.setdefault(cmd, []).append((future, condition))
+        return future
+
+    def discard(self, cmd: str, future: asyncio.Future):
+        """移除等待的请求."""
+        waiters = self.waiters.get(cmd, None)
+        if waiters is None:
+            return
+        waiters[:] = [w for w in waiters if w[0] is not future]
+        if not waiters:
+            self.waiters.pop(cmd, None)
 
     async def delete_messages(self, messages: List[Message]):
         """删除一系列消息."""
@@ -53,6 +148,56 @@ class Link:
 
         return await asyncio.gather(*[delete(m) for m in messages])
 
+    async def _delete_later(self, message: Message, delay: float = 0.5):
+        await asyncio.sleep(delay)
+        await self.delete_messages([message])
+
+    async def _handler(self, client: Client, message: Message):
+        try:
+            toml = tomli.loads(message.text)
+        except tomli.TOMLDecodeError:
+            # 非云服务响应, 交由其他处理器处理
+            message.continue_propagation()
+        for future, condition in list(self.waiters.get(toml.get("command", None), [])):
+            if future.done():
+                continue
+            if condition is None:
+                cond = True
+            elif asyncio.iscoroutinefunction(condition):
+                cond = await condition(toml)
+            else:
+                cond = condition(toml)
+            if cond and not future.done():
+                future.set_result(toml)
+                asyncio.create_task(self._delete_later(message))
+                break
+        message.continue_propagation()
+
+
+class Link:
+    """云服务类, 用于认证和高级权限任务通讯."""
+
+    bot = "embykeeper_auth_bot"
+    post_count = 0  # 正在进行的请求数
+    request_count = 0  # 已发送的请求数
+    timeout_count = 0  # 超时的请求数
+    latency = 0  # 请求响应时间的平滑值
+
+    def __init__(self, client: Client):
+        self.client = client
+        self.log = logger.bind(scheme="telelink", username=client.me.name)
+
+    @property
+    def instance(self):
+        """当前设备识别码."""
+        rd = random.Random()
+        rd.seed(uuid.getnode())
+        return uuid.UUID(int=rd.getrandbits(128))
+
+    async def delete_messages(self, messages: List[Message]):
+        """删除一系列消息."""
+        return await LinkChannel.of(self.client).delete_messages(messages)
+
     async def post(
         self,
         cmd,
@@ -81,19 +226,17 @@ class Link:
             if photo and file:
                 raise ValueError("can not use both photo and file")
 
+            channel = LinkChannel.of(self.client)
             for r in range(retries):
                 try:
                     await self.client.mute_chat(self.bot)
                 except FloodWait:
                     self.log.debug(f"[gray50]设置禁用提醒因访问超限而失败: {self.bot}[/]")
-                future = asyncio.Future()
-                handler = MessageHandler(
-                    async_partial(self._handler, cmd=cmd, future=future, condition=condition),
-                    filters.text & filters.bot & filters.user(self.bot),
-                )
-                await self.client.add_handler(handler, group=1)
+                future = channel.wait(cmd, condition)
                 try:
                     messages = []
+                    Link.request_count += 1
+                    start = time.perf_counter()
                     if photo:
                         messages.append(await self.client.send_photo(self.bot, photo, caption=cmd))
                     elif file:
@@ -102,6 +245,8 @@ class Link:
                         messages.append(await self.client.send_message(self.bot, cmd))
                     self.log.debug(f"[gray50]-> {cmd}[/]")
                     results = await asyncio.wait_for(future, timeout=timeout)
+                    latency = time.perf_counter() - start
+                    Link.latency = latency if not Link.latency else 0.8 * Link.latency + 0.2 * latency
                 except asyncio.CancelledError:
                     try:
                         await asyncio.wait_for(self.delete_messages(messages), 1.0)
@@ -110,6 +255,7 @@ class Link:
                     finally:
                         raise
                 except asyncio.TimeoutError:
+                    Link.timeout_count += 1
                     await self.delete_messages(messages)
                     if r + 1 < retries:
                         self.log.info(f"{name}超时 ({r + 1}/{retries}), 将在 3 秒后重试.")
@@ -134,7 +280,7 @@ class Link:
                     status, errmsg = [results.get(p, None) for p in ("status", "errmsg")]
                     if status == "error":
                         if fail:
-                            raise LinkError(f"{errmsg}.")
+                            raise LinkDeniedError(f"{errmsg}.")
                         else:
                             self.log.warning(f"{name}错误: {errmsg}.")
                             return False
@@ -148,61 +294,25 @@ class Link:
                             self.log.warning(f"{name}出现未知错误.")
                             return False
                 finally:
-                    await self.client.remove_handler(handler, group=1)
+                    channel.discard(cmd, future)
 
         finally:
             Link.post_count -= 1
 
-    async def _handler(
-        self,
-        client: Client,
-        message: Message,
-        cmd: str,
-        future: asyncio.Future,
-        condition: Union[bool, Callable[..., Coroutine], Callable] = None,
-    ):
-        try:
-            toml = tomli.loads(message.text)
-        except tomli.TOMLDecodeError:
-            self.delete_messages([message])
-        else:
-            try:
-                if toml.get("command", None) == cmd:
-                    if condition is None:
-                        cond = True
-                    elif asyncio.iscoroutinefunction(condition):
-                        cond = await condition(toml)
-                    elif callable(condition):
-                        cond = condition(toml)
-                    if cond:
-                        future.set_result(toml)
-                        await asyncio.sleep(0.5)
-                        await self.delete_messages([message])
-                        return
-            except asyncio.CancelledError as e:
-                try:
-                    await asyncio.wait_for(self.delete_messages([message]), 1)
-                except asyncio.TimeoutError:
-                    pass
-                finally:
-                    future.set_exception(e)
-            finally:
-                message.continue_propagation()
-
-    async def auth(self, service: str, log_func=None):
-        """向机器人发送授权请求."""
-        async with authed_services_lock:
-            user_auth_cache = authed_services.get(self.client.me.id, {}).get(service, None)
+    async def _auth(self, service: str):
+        """认证服务并缓存结果, 认证失败的原因将保存以在使用该服务时输出."""
+        uid = self.client.me.id
+        async with authed_services_locks.setdefault((uid, service), asyncio.Lock()):
+            user_auth_cache = authed_services.get(uid, {}).get(service, None)
             if user_auth_cache is not None:
                 return user_auth_cache
 
-            # No cache, perform auth
-            if not log_func:
-                result = await self.post(
-                    f"/auth {service} {self.instance}", name=f"服务 {service.upper()} 认证"
-                )
-                authed_services.setdefault(self.client.me.id, {})[service] = bool(result)
-                return bool(result)
+            cache = AuthCache.of(getattr(self.client, "workdir", None))
+            key = f"{uid}.{service}.{self.instance}"
+            entry = cache.get(key) if cache else None
+            if entry:
+                result, errmsg = entry
+                self.log.debug(f"[gray50]使用缓存的服务 {service.upper()} 认证结果.[/]")
             else:
                 try:
                     await self.post(
@@ -210,15 +320,41 @@ class Link:
                         name=f"服务 {service.upper()} 认证",
                         fail=True,
                     )
+                except LinkDeniedError as e:
+                    result, errmsg = False, str(e)
+                    if cache:
+                        cache.set(key, result, errmsg)
                 except LinkError as e:
-                    log_func(f"初始化错误: 使用 {service.upper()} 服务, 但{e}")
-                    if "权限不足" in str(e):
+                    # 超时等临时错误仅在本次运行中缓存
+                    result, errmsg = False, str(e)
+                else:
+                    result, errmsg = True, None
+                    if cache:
+                        cache.set(key, result, errmsg)
+            if errmsg:
+                authed_errors.setdefault(uid, {})[service] = errmsg
+            authed_services.setdefault(uid, {})[service] = result
+            return result
+
+    async def auth(self, service: str, log_func=None):
+        """向机器人发送授权请求."""
+        result = await self._auth(service)
+        if not result:
+            errmsg = authed_errors.get(self.client.me.id, {}).pop(service, None)
+            if errmsg:
+                if log_func:
+                    log_func(f"初始化错误: 使用 {service.upper()} 服务, 但{errmsg}")
+                    if "权限不足" in errmsg:
                         await self._show_super_ad()
-                    authed_services.setdefault(self.client.me.id, {})[service] = False
-                    return False
                 else:
-                    authed_services.setdefault(self.client.me.id, {})[service] = True
-                    return True
+                    self.log.warning(f"服务 {service.upper()} 认证失败: {errmsg}")
+        return result
+
+    async def auth_batch(self, services: Iterable[str]):
+        """并发认证多个服务, 已缓存的服务不会重复请求, 返回各服务的认证结果."""
+        services = list(dict.fromkeys(services))
+        results = await asyncio.gather(*[self._auth(s) for s in services])
+        return dict(zip(services, results))
 
     async def _show_super_ad(self):
         async with super_ad_shown_lock:
@@ -1,6 +1,8 @@
 # 该文件用于同机器人 Messager, Monitor 和 Bots 之间的异步锁和通讯
 
 import asyncio
+import time
+from typing import Callable, List
 
 from cachetools import TTLCache
 
@@ -12,11 +14,56 @@ misty_locks = {}  # uid: lock
 
 pornemby_nohp = {}  # uid: date
 pornemby_messager_enabled = {}  # uid: bool
-pornemby_alert = {}  # uid: bool
+pornemby_alert = {}  # uid: AlertState, 真值表示正处于风险急停
 pornemby_messager_mids = {}  # uid: list(mid)
 
 super_ad_shown = {}  # uid: bool
 super_ad_shown_lock = asyncio.Lock()
 
 authed_services = {}  # uid: {service: bool}
-authed_services_lock = asyncio.Lock()
+authed_services_locks = {}  # (uid, service): lock
+authed_errors = {}  # uid: {service: errmsg}
+
+
+class AlertState:
+    """
+    风险急停状态.
+    说明:
+        以截止时间 (time.monotonic, 永久停止时为无穷大) 表示, 判断是否急停无需加锁或轮询.
+        急停开始和结束时调用已注册的监听函数, 参数为是否正处于急停.
+    """
+
+    def __init__(self):
+        self.deadline = 0.0
+        self.timer: asyncio.TimerHandle = None
+        self.listeners: List[Callable[[bool], None]] = []
+
+    def __bool__(self):
+        return self.deadline > time.monotonic()
+
+    @property
+    def remaining(self):
+        """剩余急停时间 (秒)."""
+        return max(0.0, self.deadline - time.monotonic())
+
+    def set(self, seconds: float = None):
+        """开始或延长急停, 未指定时间时永久停止. 若当前急停截止时间更晚则不作修改, 返回是否修改."""
+        deadline = float("inf") if seconds is None else time.monotonic() + seconds
+        if deadline <= self.deadline:
+            return False
+        active = bool(self)
+        self.deadline = deadline
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if seconds is not None:
+            self.timer = asyncio.get_running_loop().call_later(seconds, self._notify, False)
+        if not active:
+            self._notify(True)
+        return True
+
+    def _notify(self, active: bool):
+        if not active:
+            self.timer = None
+        for listener in list(self.listeners):
+            listener(active)
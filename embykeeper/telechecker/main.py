@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import ast
 import asyncio
 from datetime import datetime, time
 from functools import lru_cache
@@ -7,13 +8,16 @@ import inspect
 import pkgutil
 import random
 import re
-from typing import List, Type
+from typing import Dict, List, Optional, Set, Tuple, Type
 from importlib import import_module
 from pathlib import Path
 import json
 
+from appdirs import user_cache_dir
 from loguru import logger
 
+from .. import __name__ as __app_name__, profiling
+from ..ocr import OCRService
 from ..utils import next_random_datetime
 from . import __name__ as __product__
 from .link import Link
@@ -23,6 +27,8 @@ from .bots._base import BaseBotCheckin, CheckinResult
 
 logger = logger.bind(scheme="telegram")
 
+OCR_PRELOAD_LEAD = 120  # 签到开始前预加载验证码识别模型的秒数
+
 
 def get_spec(type: str):
     """服务模块路径解析."""
@@ -40,16 +46,118 @@ def get_spec(type: str):
     return sub, suffix
 
 
+PLUGIN_CACHE_VERSION = 3
+PLUGIN_ATTRS = (
+    "bot_username",
+    "chat_name",
+    "additional_auth",
+    "ocr",
+    "bot_use_captcha",
+    "bot_captcha_char_range",
+)
+PLUGIN_BASES_IGNORED = ("ABC", "object")  # 不包含站点属性的外部基类
+
+
+def scan_plugin(file: Path) -> dict:
+    """静态解析站点模块, 读取 __ignore__ 标记, 同包内的导入和各类的基类及常量属性, 不导入模块."""
+
+    def scan_class(node: ast.ClassDef):
+        bases = [b.id if isinstance(b, ast.Name) else None for b in node.bases]
+        attrs = {}
+        dynamic = []  # 值无法静态确定的属性
+        nested = []
+        for n in node.body:
+            if isinstance(n, ast.Assign) and len(n.targets) == 1 and isinstance(n.targets[0], ast.Name):
+                target, value = n.targets[0].id, n.value
+            elif isinstance(n, ast.AnnAssign) and isinstance(n.target, ast.Name) and n.value:
+                target, value = n.target.id, n.value
+            elif isinstance(n, ast.ClassDef):
+                nested.append(scan_class(n))
+                continue
+            else:
+                continue
+            if target in PLUGIN_ATTRS:
+                try:
+                    # 与缓存读出的结果保持一致, 无法序列化的值视为动态属性
+                    attrs[target] = json.loads(json.dumps(ast.literal_eval(value)))
+                except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+                    dynamic.append(target)
+        return {"class": node.name, "bases": bases, "attrs": attrs, "dynamic": dynamic, "nested": nested}
+
+    tree = ast.parse(file.read_bytes(), str(file))
+    ignore = False
+    imports = {}  # 本地名称: [同包模块名, 类名]
+    classes = []
+    for n in tree.body:
+        if isinstance(n, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id == "__ignore__" for t in n.targets
+        ):
+            try:
+                ignore = bool(ast.literal_eval(n.value))
+            except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+                ignore = False
+        elif isinstance(n, ast.ImportFrom) and n.level == 1 and n.module and "." not in n.module:
+            for alias in n.names:
+                imports[alias.asname or alias.name] = [n.module, alias.name]
+        elif isinstance(n, ast.ClassDef):
+            classes.append(scan_class(n))
+    return {"ignore": ignore, "imports": imports, "classes": classes}
+
+
+@lru_cache
+def get_registry(type: str) -> Dict[str, dict]:
+    """
+    获取服务中所有站点模块的静态信息, 无需导入模块.
+    说明:
+        解析结果以文件修改时间为键缓存在用户缓存目录中, 仅当模块文件变化时重新解析.
+        无法读取源码 (如打包后仅有字节码) 时, 退回到导入模块读取.
+    """
+    sub, _ = get_spec(type)
+    typemodule = import_module(f"{__product__}.{sub}")
+    cache_file = Path(user_cache_dir(__app_name__)) / "plugins.json"
+    try:
+        cache = json.loads(cache_file.read_text(encoding="utf-8"))
+        if not isinstance(cache, dict) or cache.get("version", None) != PLUGIN_CACHE_VERSION:
+            cache = {"version": PLUGIN_CACHE_VERSION}
+    except (OSError, ValueError):
+        cache = {"version": PLUGIN_CACHE_VERSION}
+    changed = False
+    registry = {}
+    for finder, mn, ispkg in pkgutil.iter_modules(typemodule.__path__):
+        file = Path(finder.path) / mn / "__init__.py" if ispkg else Path(finder.path) / f"{mn}.py"
+        key = f"{sub}.{mn}"
+        try:
+            mtime = file.stat().st_mtime_ns
+        except OSError:
+            module = import_module(f"{__product__}.{sub}.{mn}")
+            registry[mn] = {"ignore": bool(getattr(module, "__ignore__", False)), "classes": None}
+            continue
+        entry = cache.get(key, None)
+        if not entry or entry.get("mtime", None) != mtime:
+            try:
+                entry = {"mtime": mtime, **scan_plugin(file)}
+            except (OSError, SyntaxError, ValueError):
+                module = import_module(f"{__product__}.{sub}.{mn}")
+                entry = {"mtime": None, "ignore": bool(getattr(module, "__ignore__", False)), "classes": None}
+            cache[key] = entry
+            changed = True
+        registry[mn] = entry
+    if changed:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+        except OSError as e:
+            logger.debug(f"写入站点模块缓存失败: {e}")
+    return registry
+
+
 @lru_cache
 def get_names(type: str, allow_ignore=False) -> List[str]:
     """列出服务中所有可用站点."""
-    sub, _ = get_spec(type)
     results = []
-    typemodule = import_module(f"{__product__}.{sub}")
-    for _, mn, _ in pkgutil.iter_modules(typemodule.__path__):
-        module = import_module(f"{__product__}.{sub}.{mn}")
+    for mn, entry in get_registry(type).items():
         if not allow_ignore:
-            if not getattr(module, "__ignore__", False):
+            if not entry["ignore"]:
                 results.append(mn)
         else:
             if (not mn.startswith("_")) and (not mn.startswith("test")):
@@ -59,7 +167,12 @@ def get_names(type: str, allow_ignore=False) -> List[str]:
 
 def get_cls(type: str, names: List[str] = None) -> List[Type]:
     """获得服务特定站点的所有类."""
-    sub, suffix = get_spec(type)
+    with profiling.phase(f"plugins {type}"):
+        return _get_cls(type, names)
+
+
+def get_site_names(type: str, names: List[str] = None) -> List[str]:
+    """将配置中的站点列表 (支持 all, sgk, +/- 前缀) 展开为站点名称列表."""
     if names == None:
         names = get_names(type)
 
@@ -92,10 +205,13 @@ def get_cls(type: str, names: List[str] = None) -> List[Type]:
     # 应用排除项
     names = names - exclude_names
     # 添加附加项
-    names = list(names | include_names)
+    return list(names | include_names)
 
+
+def _get_cls(type: str, names: List[str] = None) -> List[Type]:
+    sub, suffix = get_spec(type)
     results = []
-    for name in names:
+    for name in get_site_names(type, names):
         match = re.match(r"templ_(\w+)<(\w+)>", name)
         if match:
             try:
@@ -110,6 +226,10 @@ def get_cls(type: str, names: List[str] = None) -> List[Type]:
                 logger.warning(f'您配置的 "{type}" 不支持站点 "{name}", 请从以下站点中选择:')
                 logger.warning(", ".join(all_names))
         else:
+            if name.lower() not in get_registry(type):
+                logger.warning(f'您配置的 "{type}" 不支持站点 "{name}", 请从以下站点中选择:')
+                logger.warning(", ".join(get_names(type)))
+                continue
             try:
                 module = import_module(f"{__product__}.{sub}.{name.lower()}")
                 for cn, cls in inspect.getmembers(module, inspect.isclass):
@@ -134,6 +254,110 @@ def extract(clss: List[Type]) -> List[Type]:
     return extracted
 
 
+def resolve_site_attrs(registry: Dict[str, dict], module: str, cls: dict, depth: int = 0) -> Optional[dict]:
+    """沿继承链合并类的静态属性, 基类或属性值无法静态确定时返回 None."""
+    entry = registry.get(module, None)
+    if not entry or entry.get("classes", None) is None or cls["dynamic"] or depth > 16:
+        return None
+    defined = {c["class"]: c for c in entry["classes"]}
+    attrs = {}
+    # 靠前的基类优先
+    for base in reversed(cls["bases"]):
+        if base in PLUGIN_BASES_IGNORED:
+            continue
+        if base in defined:
+            base_attrs = resolve_site_attrs(registry, module, defined[base], depth + 1)
+        elif base in entry["imports"]:
+            base_module, base_name = entry["imports"][base]
+            base_entry = registry.get(base_module, None)
+            base_cls = None
+            for c in (base_entry or {}).get("classes", None) or ():
+                if c["class"] == base_name:
+                    base_cls = c
+            base_attrs = base_cls and resolve_site_attrs(registry, base_module, base_cls, depth + 1)
+        else:
+            return None
+        if base_attrs is None:
+            return None
+        attrs.update(base_attrs)
+    attrs.update(cls["attrs"])
+    return attrs
+
+
+def get_site_attrs(type: str, names: List[str] = None) -> List[dict]:
+    """
+    获取站点类 (已展开嵌套类) 的属性, 用于调度前的 OCR 预加载和认证预取.
+    说明:
+        优先从站点注册表中静态解析, 模板站点或无法静态确定的站点退回到导入模块读取.
+    """
+    _, suffix = get_spec(type)
+    registry = get_registry(type)
+    results = []
+    for name in get_site_names(type, names):
+        entry = registry.get(name.lower(), None)
+        site = None
+        if entry and entry.get("classes", None) is not None:
+            # 与 _get_cls 相同的类名匹配规则, 在模块中定义或导入的类均可匹配
+            expected = (name.replace("_", "").replace("_old", "") + suffix).lower()
+            matched = [c for c in entry["classes"] if c["class"].lower() == expected]
+            if matched and not any(i.lower() == expected for i in entry["imports"]):
+                site = []
+                for cls in matched:
+                    for c in cls["nested"] or [cls]:
+                        attrs = resolve_site_attrs(registry, name.lower(), c)
+                        if attrs is None:
+                            site = None
+                            break
+                        site.append(attrs)
+                    if site is None:
+                        break
+        if site is None:
+            site = [{a: getattr(c, a, None) for a in PLUGIN_ATTRS} for c in extract(get_cls(type, [name]))]
+        results.extend(site)
+    return results
+
+
+def get_additional_auth(type: str, names: List[str] = None) -> List[str]:
+    """获取站点所需的额外认证."""
+    auths = []
+    for attrs in get_site_attrs(type, names):
+        for a in attrs.get("additional_auth", None) or []:
+            if a not in auths:
+                auths.append(a)
+    return auths
+
+
+def get_ocr_specs(config: dict, type: str, account_key: str, account_default: bool) -> Set[Tuple]:
+    """列出配置中启用的签到器或监控器所需的 OCR 模型 (ocr_name, char_range)."""
+    specs = set()
+    for account in config.get("telegram", []):
+        if account.get(account_key, account_default) is not True:
+            continue
+        service_config = account.get("service", {})
+        if not service_config:
+            service_config: dict = config.get("service", {})
+        for attrs in get_site_attrs(type, names=service_config.get(type, None)):
+            if type == "checkiner":
+                if attrs.get("bot_use_captcha", None):
+                    specs.add((attrs.get("ocr", None), attrs.get("bot_captcha_char_range", None)))
+            elif attrs.get("ocr", None):
+                specs.add((attrs["ocr"], None))
+    return specs
+
+
+async def preload_ocr(config: dict, type: str, account_key: str, account_default: bool) -> List[OCRService]:
+    """启用 ocr_preload 时, 预先启动签到器或监控器所需的 OCR 模型."""
+    if not config.get("ocr_preload", False):
+        return []
+    specs = get_ocr_specs(config, type, account_key, account_default)
+    if not specs:
+        return []
+    logger.debug(f"正在预加载 {len(specs)} 个验证码识别模型.")
+    return await OCRService.preload(
+        specs, basedir=config.get("basedir", None), proxy=config.get("proxy", None)
+    )
+
+
 async def _checkin_task(checkiner: BaseBotCheckin, sem, wait=0):
     """签到器壳, 用于随机等待开始."""
     if wait > 0:
@@ -161,11 +385,17 @@ async def checkiner(config: dict, instant=False):
             if not service_config:
                 service_config: dict = config.get("service", {})
             names = service_config.get("checkiner", None)
+            link = Link(tg)
+            # 认证预取与导入站点模块同时进行
+            auth = asyncio.create_task(
+                link.auth_batch(["checkiner", *get_additional_auth("checkiner", names)])
+            )
             clses = extract(get_cls("checkiner", names=names))
+            await auth
             if not clses:
                 log.warning("没有任何有效签到站点, 签到将跳过.")
                 continue
-            if not await Link(tg).auth("checkiner", log_func=log.error):
+            if not await link.auth("checkiner", log_func=log.error):
                 continue
             sem = asyncio.Semaphore(int(config.get("concurrent", 1)))
             checkiners: List[BaseBotCheckin] = [
@@ -283,6 +513,9 @@ async def checkiner_schedule(
             except OSError as e:
                 logger.debug(f"存储时间戳失败: {e}")
 
+        # 在签到开始前预加载验证码识别模型, 并保持运行至签到结束
+        await asyncio.sleep((next_dt - datetime.now()).total_seconds() - OCR_PRELOAD_LEAD)
+        ocrs = await preload_ocr(config, "checkiner", "checkin", True)
         await asyncio.sleep((next_dt - datetime.now()).total_seconds())
 
         try:
@@ -290,44 +523,56 @@ async def checkiner_schedule(
         except OSError as e:
             logger.debug(f"删除时间戳文件失败: {e}")
 
-        await checkiner(config, instant=instant)
+        try:
+            await checkiner(config, instant=instant)
+        finally:
+            OCRService.release(ocrs)
 
 
 async def monitorer(config: dict):
     """监控器入口函数."""
     logger.debug("正在启动消息监控模块.")
     jobs = []
-    async with ClientsSession.from_config(config, monitor=(True, False)) as clients:
-        async for tg in clients:
-            log = logger.bind(scheme="telemonitor", username=tg.me.name)
-            logger.info("已连接到 Telegram, 监控器正在初始化.")
-            service_config = config.get("telegram", [])[tg._config_index].get("service", {})
-            if not service_config:
-                service_config: dict = config.get("service", {})
-            names = service_config.get("monitor", None)
-            clses = extract(get_cls("monitor", names=names))
-            if not clses:
-                log.warning("没有任何有效监控站点, 监控将跳过.")
-            if not await Link(tg).auth("monitorer", log_func=log.error):
-                continue
-            names = []
-            for cls in clses:
-                cls_config = config.get("monitor", {}).get(cls.__module__.rsplit(".", 1)[-1], {})
-                jobs.append(
-                    asyncio.create_task(
-                        cls(
-                            tg,
-                            nofail=config.get("nofail", True),
-                            basedir=config.get("basedir", None),
-                            proxy=config.get("proxy", None),
-                            config=cls_config,
-                        )._start()
-                    )
+    ocrs = await preload_ocr(config, "monitor", "monitor", False)
+    try:
+        async with ClientsSession.from_config(config, monitor=(True, False)) as clients:
+            async for tg in clients:
+                log = logger.bind(scheme="telemonitor", username=tg.me.name)
+                logger.info("已连接到 Telegram, 监控器正在初始化.")
+                service_config = config.get("telegram", [])[tg._config_index].get("service", {})
+                if not service_config:
+                    service_config: dict = config.get("service", {})
+                names = service_config.get("monitor", None)
+                link = Link(tg)
+                auth = asyncio.create_task(
+                    link.auth_batch(["monitorer", *get_additional_auth("monitor", names)])
                 )
-                names.append(cls.name)
-            if names:
-                log.debug(f'已启用监控器: {", ".join(names)}')
-        await asyncio.gather(*jobs)
+                clses = extract(get_cls("monitor", names=names))
+                await auth
+                if not clses:
+                    log.warning("没有任何有效监控站点, 监控将跳过.")
+                if not await link.auth("monitorer", log_func=log.error):
+                    continue
+                names = []
+                for cls in clses:
+                    cls_config = config.get("monitor", {}).get(cls.__module__.rsplit(".", 1)[-1], {})
+                    jobs.append(
+                        asyncio.create_task(
+                            cls(
+                                tg,
+                                nofail=config.get("nofail", True),
+                                basedir=config.get("basedir", None),
+                                proxy=config.get("proxy", None),
+                                config=cls_config,
+                            )._start()
+                        )
+                    )
+                    names.append(cls.name)
+                if names:
+                    log.debug(f'已启用监控器: {", ".join(names)}')
+            await asyncio.gather(*jobs)
+    finally:
+        OCRService.release(ocrs)
 
 
 async def messager(config: dict):
@@ -342,10 +587,13 @@ async def messager(config: dict):
             if not service_config:
                 service_config: dict = config.get("service", {})
             names = service_config.get("messager", None)
+            link = Link(tg)
+            auth = asyncio.create_task(link.auth_batch(["messager", *get_additional_auth("messager", names)]))
             clses = extract(get_cls("messager", names=names))
+            await auth
             if not clses:
                 log.warning("没有任何有效自动水群站点, 自动水群将跳过.")
-            if not await Link(tg).auth("messager", log_func=log.error):
+            if not await link.auth("messager", log_func=log.error):
                 continue
             for cls in clses:
                 cls_config = config.get("messager", {}).get(cls.__module__.rsplit(".", 1)[-1], {})
@@ -3,10 +3,11 @@ from __future__ import annotations
 import asyncio
 from datetime import date, datetime, time
 from pathlib import Path
-from typing import TYPE_CHECKING, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
 from loguru import logger
-from pyrogram.types import User
+from cachetools import TTLCache
+from pyrogram.types import Message, User
 import yaml
 
 from embykeeper.data import get_data
@@ -32,9 +33,12 @@ class SmartMessager:
     at: Tuple[time, time] = None  # 可发送的时间范围
     msg_per_day: int = 10  # 每天发送的消息数量
     min_msg_gap = 5  # 最小消息间隔
+    history_limit = 50  # 用于推测的最近消息数量
 
     site_last_message_time = None
     site_lock = asyncio.Lock()
+    history: Dict[Tuple[int, int], List[Message]] = {}  # (uid, chat_id): 最近消息, 由新到旧
+    replies = TTLCache(maxsize=4096, ttl=86400)  # (uid, chat_id, message_id): 被回复消息的文本
 
     def __init__(self, account, me: User = None, nofail=True, proxy=None, basedir=None, config: dict = None):
         """
@@ -159,23 +163,53 @@ class SmartMessager:
         """可重写的初始化函数, 返回 False 将视为初始化错误."""
         return True
 
+    async def get_history(self, tg: Client, chat_id: int):
+        """获取会话最近的消息 (由新到旧), 已缓存时仅获取上次之后的新消息."""
+        key = (tg.me.id, chat_id)
+        cached = self.history.get(key, [])
+        min_id = cached[0].id if cached else 0
+        new = [msg async for msg in tg.get_chat_history(chat_id, limit=self.history_limit, min_id=min_id)]
+        messages = self.history[key] = (new + cached)[: self.history_limit]
+        return messages
+
+    async def get_reply_texts(self, tg: Client, chat_id: int, messages: List[Message]):
+        """获取消息所回复的消息文本, 优先从已获取的消息中查找, 其余合并为一次请求."""
+        texts = {msg.id: str(msg.caption or msg.text or "") for msg in messages}
+        missing = set()
+        for msg in messages:
+            rid = msg.reply_to_message_id
+            if not rid or rid in texts:
+                continue
+            text = self.replies.get((tg.me.id, chat_id, rid), None)
+            if text is None:
+                missing.add(rid)
+            else:
+                texts[rid] = text
+        if missing:
+            for rmsg in await tg.get_messages(chat_id, sorted(missing), replies=0):
+                if rmsg and not rmsg.empty:
+                    text = texts[rmsg.id] = str(rmsg.caption or rmsg.text or "")
+                    self.replies[(tg.me.id, chat_id, rmsg.id)] = text
+        return texts
+
     async def get_infer_prompt(self, tg: Client, log: Logger, time: datetime = None):
         chat = await tg.get_chat(self.chat_name)
+        messages = await self.get_history(tg, chat.id)
+        if self.min_msg_gap:
+            for i, msg in enumerate(messages[: self.min_msg_gap - 1], 1):
+                if msg.outgoing:
+                    log.info(f"低于发送消息间隔要求 ({i} < {self.min_msg_gap}), 将不发送消息.")
+                    return
+        reply_texts = await self.get_reply_texts(tg, chat.id, messages)
         context = []
-        i = 0
-        async for msg in tg.get_chat_history(chat.id, limit=50):
-            i += 1
-            if self.min_msg_gap and msg.outgoing and i < self.min_msg_gap:
-                log.info(f"低于发送消息间隔要求 ({i} < {self.min_msg_gap}), 将不发送消息.")
-                return
+        for msg in messages:
             spec = []
             text = str(msg.caption or msg.text or "")
             spec.append(f"消息发送时间为 {msg.date}")
             if msg.photo:
                 spec.append("包含一张照片")
-            if msg.reply_to_message_id:
-                rmsg = await tg.get_messages(chat.id, msg.reply_to_message_id)
-                spec.append(f"回复了消息: {truncate_str(str(rmsg.caption or rmsg.text or ''), 60)}")
+            if msg.reply_to_message_id in reply_texts:
+                spec.append(f"回复了消息: {truncate_str(reply_texts[msg.reply_to_message_id], 60)}")
             spec = " ".join(spec)
             ctx = truncate_str(text, 180)
             if msg.from_user and msg.from_user.name:
@@ -15,10 +15,10 @@ from pyrogram.errors import UsernameNotOccupied, UserNotParticipant, FloodWait,
 from pyrogram.handlers import EditedMessageHandler, MessageHandler
 from pyrogram.types import Message, User
 
-from embykeeper import __name__ as __product__
+from embykeeper import __name__ as __product__, profiling
 from embykeeper.utils import show_exception, to_iterable, truncate_str, AsyncCountPool, optional
 
-from ..tele import Client
+from ..tele import ChatMemberCache, Client
 from ..link import Link
 
 __ignore__ = True
@@ -168,8 +168,9 @@ class Monitor:
         """执行监控上下文."""
         group = await self.group_pool.append(self)
         handlers = self.get_handlers()
-        for h in handlers:
-            await self.client.add_handler(h, group=group)
+        with profiling.phase(f"handlers {self.name}"):
+            for h in handlers:
+                await self.client.add_handler(h, group=group)
         yield
         for h in handlers:
             try:
@@ -219,7 +220,7 @@ class Monitor:
                 return False
         try:
             if chat.type in (ChatType.GROUP, ChatType.SUPERGROUP):
-                await chat.get_member("me")
+                await ChatMemberCache.get_status(self.client, chat.id, self.client.me.id)
         except UserNotParticipant:
             self.log.info(f'跳过监控: 尚未加入群组 "{chat.title}".')
             return False
@@ -260,16 +261,26 @@ class Monitor:
             return False
         text = message.text or message.caption
         if cls.chat_keyword:
-            for k in to_iterable(cls.chat_keyword):
+            for k in cls.get_keyword_patterns():
                 if k is None or text is None:
                     if k is None and text is None:
                         yield None
                 else:
-                    for m in re.findall(k, text, re.IGNORECASE):
+                    for m in k.findall(text):
                         yield m
         else:
             yield text
 
+    @classmethod
+    def get_keyword_patterns(cls):
+        """获取预编译的 chat_keyword 正则表达式, 每个站点类仅编译一次."""
+        source, patterns = cls.__dict__.get("_keyword_patterns", (None, None))
+        if source is not cls.chat_keyword:
+            source = cls.chat_keyword
+            patterns = [None if k is None else re.compile(k, re.IGNORECASE) for k in to_iterable(source)]
+            cls._keyword_patterns = (source, patterns)
+        return patterns
+
     async def get_reply(self, message: Message, key: Union[str, List[str]]):
         """根据 keys 生成回复内容."""
         if callable(self.chat_reply):
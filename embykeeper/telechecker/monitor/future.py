@@ -5,9 +5,9 @@ from urllib.parse import parse_qs, urlparse
 from pyrogram import filters
 from pyrogram.types import Message
 from pyrogram.raw.functions.messages import RequestWebView
-import httpx
 from faker import Faker
 
+from embykeeper.http import borrow
 from embykeeper.utils import get_proxy_str
 
 from ..link import Link
@@ -45,7 +45,7 @@ class FutureMonitor(Monitor):
                 "cf-turnstile-response": token,
             }
             try:
-                async with httpx.AsyncClient(http2=True, proxy=get_proxy_str(self.proxy)) as client:
+                async with borrow(proxy=get_proxy_str(self.proxy)) as client:
                     resp = await client.post(url_submit, headers=headers, data=data)
                     result = resp.text
                     if "完成" in result:
@@ -1,15 +1,15 @@
 from datetime import datetime, timedelta
 import random
-import re
 
 import asyncio
 from typing import List
-from cachetools import TTLCache
 from pyrogram.types import Message, User, Chat
-from pyrogram.enums import ChatMemberStatus, MessageServiceType, MessageEntityType
+from pyrogram.enums import MessageServiceType, MessageEntityType
 from pyrogram.errors import BadRequest
 
-from ..lock import pornemby_alert, pornemby_messager_mids
+from ..keywords import compile_patterns
+from ..lock import AlertState, pornemby_alert, pornemby_messager_mids
+from ..tele import ChatMemberCache
 from ._base import Monitor
 
 __ignore__ = True
@@ -32,12 +32,10 @@ class PornembyAlertMonitor(Monitor):
     reply_interval = 7200
 
     async def init(self):
-        self.lock = asyncio.Lock()
         self.last_reply = None
-        self.alert_remaining = 0.0
-        self.member_status_cache = TTLCache(maxsize=128, ttl=86400)
-        self.member_status_cache_lock = asyncio.Lock()
-        self.monitor_task = asyncio.create_task(self.monitor())
+        self.alert = pornemby_alert.setdefault(self.client.me.id, AlertState())
+        # 每个账号仅运行一个风险急停监控, 重新初始化时替换之前的监听函数
+        self.alert.listeners[:] = [self.on_alert_change]
         self.pin_checked = False
         self.pin_checked_lock = False
         return True
@@ -47,59 +45,38 @@ class PornembyAlertMonitor(Monitor):
             return True
         if user.is_bot:
             return False
-        async with self.member_status_cache_lock:
-            if not user.id in self.member_status_cache:
-                try:
-                    member = await self.client.get_chat_member(chat.id, user.id)
-                    self.member_status_cache[user.id] = member.status
-                except BadRequest:
-                    return False
-        if self.member_status_cache[user.id] in (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER):
-            return True
+        try:
+            return await ChatMemberCache.is_admin(self.client, chat.id, user.id)
+        except BadRequest:
+            return False
 
     def check_keyword(self, message: Message, keywords: List[str]):
         content = message.text or message.caption
         if content:
-            for k in keywords:
-                match = re.search(k, content)
-                if match:
-                    return match.group(0)
+            match = compile_patterns(tuple(keywords)).search(content)
+            if match:
+                return match.group(0)
 
-    async def monitor(self):
-        while True:
-            await self.lock.acquire()
-            while self.alert_remaining > 0:
-                pornemby_alert[self.client.me.id] = True
-                t = datetime.now()
-                self.lock.release()
-                await asyncio.sleep(1)
-                await self.lock.acquire()
-                self.alert_remaining -= (datetime.now() - t).total_seconds()
-            else:
-                pornemby_alert[self.client.me.id] = False
-            self.lock.release()
-            await asyncio.sleep(1)
+    def on_alert_change(self, active: bool):
+        if not active:
+            self.log.info("Pornemby 风险急停结束, 恢复操作.")
 
     async def set_alert(self, time: float = None, reason: str = None):
         if time:
-            async with self.lock:
-                if self.alert_remaining > time:
-                    return
-                else:
-                    msg = f"Pornemby 风险急停被触发, 停止操作 {time} 秒"
-                    if reason:
-                        msg += f" (原因: {reason})"
-                    msg += "."
-                    self.log.warning(msg)
-                    self.alert_remaining = time
+            if not self.alert.set(time):
+                return
+            msg = f"Pornemby 风险急停被触发, 停止操作 {time} 秒"
+            if reason:
+                msg += f" (原因: {reason})"
+            msg += "."
+            self.log.warning(msg)
         else:
             msg = "Pornemby 风险急停被触发, 所有操作永久停止"
             if reason:
                 msg += f" (原因: {reason})"
             msg += "."
             self.log.bind(msg=True).error(msg)
-            async with self.lock:
-                self.alert_remaining = float("inf")
+            self.alert.set()
 
     async def on_trigger(self, message: Message, key, reply):
         # 管理员回复水群消息, 永久停止, 若存在关键词即回复
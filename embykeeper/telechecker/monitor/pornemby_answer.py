@@ -1,9 +1,13 @@
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 import csv
 from datetime import datetime
 from pathlib import Path
 import random
 import re
+import sqlite3
+from typing import Iterable, Optional
+import unicodedata
 
 from pyrogram.types import Message
 from pyrogram.errors import RPCError
@@ -14,6 +18,150 @@ from ..lock import pornemby_alert
 from ._base import Monitor
 
 
+class QuestionBank:
+    """
+    Pornemby 问题答案库.
+    说明:
+        问题以规范化后的文本 (去除资料库来源和空白, 统一全半角) 为键保存在工作目录的数据库中,
+        支持增量写入和去重, 同一进程中的所有账号共享. 查询时优先按选项文本匹配答案, 以适应选项顺序变化.
+    """
+
+    DATABASE = "pornemby_question.db"
+    KEY_VERSION = 2  # 规范化规则变化时需重建键
+    CHOICES = "ABCD"
+
+    _banks = {}  # basedir: QuestionBank
+
+    @classmethod
+    def of(cls, basedir: Path):
+        """获取工作目录对应的答案库"""
+        bank = cls._banks.get(basedir, None)
+        if not bank:
+            bank = cls._banks[basedir] = cls(basedir)
+        return bank
+
+    def __init__(self, basedir: Path):
+        self.database = Path(basedir) / self.DATABASE
+        self.conn: sqlite3.Connection = None
+        self.executor: ThreadPoolExecutor = None
+
+    @staticmethod
+    def normalize(text: str):
+        """规范化问题或选项文本, 保留标点以区分仅运算符或符号不同的问题."""
+        text = unicodedata.normalize("NFKC", text)
+        text = re.sub(r"\([^\)]*From资料库:第\d+题\)", "", text)
+        return re.sub(r"\s+", "", text)
+
+    @classmethod
+    def parse_choices(cls, text: str):
+        """解析 "A:...\nB:..." 格式的选项文本."""
+        return {
+            m.group(1): m.group(2).strip()
+            for m in re.finditer(r"^\s*([ABCD])\s*[:：](.*)$", text, re.MULTILINE)
+        }
+
+    async def _run(self, func, *args):
+        if not self.executor:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pornemby-question")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _connect(self):
+        if not self.conn:
+            self.database.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(str(self.database), timeout=5, check_same_thread=False)
+            with self.conn:
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS questions (key TEXT PRIMARY KEY, question TEXT NOT NULL, "
+                    "a TEXT, b TEXT, c TEXT, d TEXT, answer TEXT NOT NULL)"
+                )
+                self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value)")
+                if self._get_meta("key_version") != self.KEY_VERSION:
+                    rows = self.conn.execute("SELECT question, a, b, c, d, answer FROM questions").fetchall()
+                    self.conn.execute("DELETE FROM questions")
+                    self._insert(self.conn, rows)
+                    self.conn.execute(
+                        "REPLACE INTO meta (name, value) VALUES (?, ?)", ("key_version", self.KEY_VERSION)
+                    )
+        return self.conn
+
+    def _insert(self, conn: sqlite3.Connection, rows):
+        conn.executemany(
+            "REPLACE INTO questions (key, question, a, b, c, d, answer) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(self.normalize(r[0]), *r) for r in rows],
+        )
+
+    def _add(self, rows):
+        with self._connect() as conn:
+            self._insert(conn, rows)
+
+    def _get(self, key: str):
+        return (
+            self._connect()
+            .execute("SELECT a, b, c, d, answer FROM questions WHERE key = ?", (key,))
+            .fetchone()
+        )
+
+    def _count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+
+    def _get_meta(self, name: str):
+        r = self._connect().execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return r[0] if r else None
+
+    def _set_meta(self, name: str, value):
+        with self._connect() as conn:
+            conn.execute("REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    async def add(self, rows: Iterable[Iterable[str]]):
+        """写入问题, 每行为 (问题, A, B, C, D, 答案), 已存在的问题将被更新."""
+        rows = [tuple(r) for r in rows]
+        if rows:
+            await self._run(self._add, rows)
+
+    async def get(self, question: str, choices: str = None) -> Optional[str]:
+        """查询问题答案, 返回当前选项中对应的字母, 未找到时返回 None."""
+        row = await self._run(self._get, self.normalize(question))
+        if not row:
+            return None
+        *stored, answer = row
+        if choices and answer in self.CHOICES:
+            text = self.normalize(stored[self.CHOICES.index(answer)] or "")
+            current = {k: self.normalize(v) for k, v in self.parse_choices(choices).items()}
+            matches = [k for k, v in current.items() if v == text]
+            if len(matches) == 1:
+                return matches[0]
+        return answer
+
+    async def count(self) -> int:
+        """答案库中的问题数."""
+        return await self._run(self._count)
+
+    async def get_updated(self) -> Optional[float]:
+        """上一次从历史消息更新的时间戳."""
+        return await self._run(self._get_meta, "updated")
+
+    async def set_updated(self, timestamp: float):
+        await self._run(self._set_meta, "updated", timestamp)
+
+    async def import_csv(self, file: Path, timestamp_file: Path = None):
+        """导入旧版的 CSV 格式缓存."""
+
+        def read():
+            with open(file, "r", encoding="utf-8") as f:
+                return [
+                    (r["Question"], r["A"], r["B"], r["C"], r["D"], r["Answer"]) for r in csv.DictReader(f)
+                ]
+
+        rows = await self._run(read)
+        await self.add(rows)
+        if timestamp_file and timestamp_file.exists():
+            try:
+                await self.set_updated(float(timestamp_file.read_text()))
+            except ValueError:
+                pass
+        return len(rows)
+
+
 class _PornembyAnswerResultMonitor(Monitor):
     name = "Pornemby 问题答案"
     chat_keyword = r"问题\d*：(.*?)\n+A:(.*)\n+B:(.*)\n+C:(.*)\n+D:(.*)\n+答案为：([ABCD])"
@@ -42,7 +190,6 @@ class _PornembyAnswerAnswerMonitor(Monitor):
     chat_keyword = r"问题\d*：(.*?)\n+(A:.*\n+B:.*\n+C:.*\n+D:.*)\n(?!\n*答案)"
     additional_auth = ["pornemby_pack"]
 
-    cache = {}
     lock = asyncio.Lock()
 
     key_map = {
@@ -54,66 +201,47 @@ class _PornembyAnswerAnswerMonitor(Monitor):
 
     def __init__(self, *args, **kw):
         super().__init__(*args, **kw)
-        self.cache_file = Path(self.basedir) / "pornemby_question.csv"
+        self.bank = QuestionBank.of(Path(self.basedir))
         self.update_task = None
 
     async def update_cache(self, to_date=None):
-        cache_timestamp = self.cache_file.with_name("pornemby_question.timestamp")
-        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
-        if not self.cache_file.exists():
-            created = True
+        updated = await self.bank.get_updated()
+        if updated is None:
+            legacy = Path(self.basedir) / "pornemby_question.csv"
+            if legacy.exists():
+                count = await self.bank.import_csv(legacy, legacy.with_name("pornemby_question.timestamp"))
+                self.log.info(f"已从旧版问题答案历史缓存导入 {count} 条问题.")
+                updated = await self.bank.get_updated()
+        if updated is None:
             to_date = datetime.fromtimestamp(0)
             self.log.info("首次使用 Pornemby 科举, 正在缓存问题答案历史.")
         else:
-            created = False
-            if cache_timestamp.exists() and not to_date:
-                with open(cache_timestamp) as f:
-                    try:
-                        to_date = datetime.fromtimestamp(float(f.read()))
-                    except ValueError:
-                        to_date = datetime.fromtimestamp(0)
-            else:
-                to_date = datetime.fromtimestamp(0)
+            to_date = to_date or datetime.fromtimestamp(updated)
             self.log.info(f"正在更新问题答案历史缓存.")
             self.log.debug(f"上一次问题答案历史写入于 {to_date.strftime('%Y-%m-%d %H:%M')}.")
+        start = datetime.now()
         count = 0
         qs = 0
         finished = False
-        with open(self.cache_file, mode="a+", newline="", encoding="utf-8") as csvfile:
-            writer = csv.writer(csvfile)
-            if created:
-                writer.writerow(["Question", "A", "B", "C", "D", "Answer"])
-            while not finished:
-                finished = True
-                m: Message
-                for g in to_iterable(self.history_chat_name):
-                    async for m in self.client.search_messages(g, limit=100, offset=count, query="答案为"):
-                        if m.date < to_date:
-                            break
-                        count += 1
-                        finished = False
-                        if m.text:
-                            for key in _PornembyAnswerResultMonitor.keys(m):
-                                qs += 1
-                                writer.writerow(key)
-                if count and (finished or count % 500 == 0):
-                    self.log.info(f"读取问题答案历史: 已读取 {qs} 问题 / {count} 信息.")
-                    await asyncio.sleep(2)
-        self.log.debug(f"已向问题答案历史缓存写入 {qs} 条问题.")
-        with open(cache_timestamp, "w+", encoding="utf-8") as f:
-            f.write(str(datetime.now().timestamp()))
-
-    async def read_cache(self):
-        if not self.cache_file.exists():
-            return {}
-        questions = {}
-        with open(self.cache_file, "r", encoding="utf-8") as csvfile:
-            rows = csv.DictReader(csvfile)
-            for row in rows:
-                entry = dict(row)
-                questions[entry["Question"]] = entry["Answer"]
-        self.log.debug(f"已从问题答案历史缓存读取 {len(questions)} 条问题.")
-        return questions
+        while not finished:
+            finished = True
+            rows = []
+            m: Message
+            for g in to_iterable(self.history_chat_name):
+                async for m in self.client.search_messages(g, limit=100, offset=count, query="答案为"):
+                    if m.date < to_date:
+                        break
+                    count += 1
+                    finished = False
+                    if m.text:
+                        rows.extend(_PornembyAnswerResultMonitor.keys(m))
+            qs += len(rows)
+            await self.bank.add(rows)
+            if count and (finished or count % 500 == 0):
+                self.log.info(f"读取问题答案历史: 已读取 {qs} 问题 / {count} 信息.")
+                await asyncio.sleep(2)
+        self.log.debug(f"已向问题答案历史缓存写入 {qs} 条问题, 共 {await self.bank.count()} 条问题.")
+        await self.bank.set_updated(start.timestamp())
 
     async def update(self):
         try:
@@ -125,7 +253,6 @@ class _PornembyAnswerAnswerMonitor(Monitor):
         else:
             try:
                 await self.update_cache()
-                self.__class__.cache = await self.read_cache()
                 return True
             finally:
                 self.lock.release()
@@ -152,7 +279,7 @@ class _PornembyAnswerAnswerMonitor(Monitor):
         if random.random() > self.config.get("possibility", 1.0):
             self.log.info(f"由于概率设置不作答: {spec}.")
             return
-        result = self.cache.get(key[0], None)
+        result = await self.bank.get(key[0], key[1])
         if result:
             self.log.info(f"从缓存回答问题为{result}: {spec}.")
         elif self.config.get("only_history", False):
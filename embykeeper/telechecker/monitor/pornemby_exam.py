@@ -3,11 +3,11 @@ from io import BytesIO
 import random
 import re
 
-import httpx
 from pyrogram.types import Message
 from PIL import Image
 import numpy as np
 
+from embykeeper.http import borrow
 from embykeeper.utils import show_exception, get_proxy_str
 
 from ..lock import pornemby_alert
@@ -56,12 +56,7 @@ class _PornembyExamAnswerMonitor(Monitor):
             try:
                 proxy = get_proxy_str(self.proxy)
                 # 使用 httpx 创建异步客户端
-                async with httpx.AsyncClient(
-                    http2=True,
-                    proxy=proxy,
-                    verify=False,
-                    follow_redirects=True,
-                ) as client:
+                async with borrow(proxy=proxy, verify=False, follow_redirects=True) as client:
                     detail_url = f"https://www.javdatabase.com/movies/{code.lower()}/"
                     response = await client.get(detail_url)
                     if response.status_code != 200:
@@ -119,12 +114,7 @@ class _PornembyExamAnswerMonitor(Monitor):
             try:
                 proxy = get_proxy_str(self.proxy)
                 # 使用 httpx 创建异步客户端
-                async with httpx.AsyncClient(
-                    http2=True,
-                    proxy=proxy,
-                    verify=False,
-                    follow_redirects=True,
-                ) as client:
+                async with borrow(proxy=proxy, verify=False, follow_redirects=True) as client:
                     # 先获取 content_id
                     detail_url = f"https://r18.dev/videos/vod/movies/detail/-/dvd_id={code.lower()}/json"
                     # 获取 content_id
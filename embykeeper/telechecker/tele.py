@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import base64
 import binascii
-from collections import OrderedDict
+import bisect
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 import asyncio
@@ -12,6 +14,7 @@ import os
 from pathlib import Path
 import pickle
 import random
+import re
 import sqlite3
 import struct
 import sys
@@ -19,6 +22,7 @@ from typing import AsyncGenerator, Optional, Union
 from sqlite3 import OperationalError
 import logging
 import tempfile
+import time
 import typing
 
 from rich.prompt import Prompt
@@ -26,7 +30,7 @@ from appdirs import user_data_dir
 from loguru import logger
 import pyrogram
 from pyrogram import raw, types, utils, filters, dispatcher
-from pyrogram.enums import SentCodeType
+from pyrogram.enums import ChatMembersFilter, ChatMemberStatus, SentCodeType
 from pyrogram.errors import (
     ChannelPrivate,
     PersistentTimestampOutdated,
@@ -53,14 +57,16 @@ from pyrogram.handlers import (
     EditedMessageHandler,
 )
 from pyrogram.storage.memory_storage import MemoryStorage
-from pyrogram.storage.sqlite_storage import SQLiteStorage
+from pyrogram.storage.sqlite_storage import SQLiteStorage, get_input_peer
 from pyrogram.storage.file_storage import USERNAMES_SCHEMA, UPDATE_STATE_SCHEMA
 
 from pyrogram.handlers.handler import Handler
 from aiocache import Cache
+from cachetools import TTLCache
 import httpx
 
-from embykeeper import var, __name__ as __product__, __version__
+from embykeeper import profiling, var, __name__ as __product__, __version__
+from embykeeper.http import HTTPPool, borrow
 from embykeeper.utils import async_partial, get_proxy_str, show_exception, to_iterable
 
 var.tele_used.set()
@@ -114,42 +120,315 @@ for h in pyrogram_session_logger.handlers[:]:
 pyrogram_session_logger.addHandler(LogRedirector())
 
 
+_UNPARSED = object()
+
+
+class HandlerTable:
+    """
+    不可变的更新处理器表, 增加或移除处理器时生成新的版本并整体替换, 处理线程可以无锁读取.
+    说明:
+        处理器按组和添加顺序排序, 并通过 filters.chat 和 filters.user 按会话和发送者索引.
+    """
+
+    __slots__ = ("version", "seq", "entries", "ordered", "routes", "wildcards")
+
+    def __init__(self, version=0, seq=0, entries=None, ordered=(), routes=None, wildcards=frozenset()):
+        self.version = version
+        self.seq = seq
+        self.entries = entries or {}  # (group, handler): ((group, seq, handler), routes)
+        self.ordered = ordered  # (group, seq, handler), 按组和添加顺序排序
+        self.routes = routes or {}  # (kind, key): frozenset((group, seq, handler))
+        self.wildcards = wildcards  # frozenset((group, seq, handler))
+
+    @classmethod
+    def get_routes(cls, flt: filters.Filter):
+        """
+        从过滤器中提取路由键, 用于按会话和发送者索引处理器.
+        说明:
+            仅 filters.chat 和 filters.user 可以被索引, 通过 "&" 组合时取其中一方, 通过 "|" 组合时需两侧均可索引.
+            返回 None 表示该过滤器无法被索引, 需要对所有更新进行检查.
+            过滤器中的会话和用户在添加处理器后被修改时, 索引不会更新.
+        """
+        if isinstance(flt, (filters.chat, filters.user)):
+            if not flt or "me" in flt:
+                return None
+            kind = "chat" if isinstance(flt, filters.chat) else "user"
+            return frozenset((kind, k) for k in flt)
+        elif isinstance(flt, filters.AndFilter):
+            base = cls.get_routes(flt.base)
+            if base is not None:
+                return base
+            return cls.get_routes(flt.other)
+        elif isinstance(flt, filters.OrFilter):
+            base = cls.get_routes(flt.base)
+            other = cls.get_routes(flt.other)
+            if base is None or other is None:
+                return None
+            return base | other
+        else:
+            return None
+
+    @staticmethod
+    def get_message_routes(message: types.Message):
+        """获取消息可能命中的所有路由键."""
+        routes = []
+        chat = message.chat
+        if chat:
+            routes.append(("chat", chat.id))
+            if chat.username:
+                routes.append(("chat", chat.username.lower()))
+        user = message.from_user
+        if user:
+            routes.append(("user", user.id))
+            if user.username:
+                routes.append(("user", user.username.lower()))
+        return routes
+
+    @staticmethod
+    def get_raw_message_routes(update, users: dict, chats: dict):
+        """
+        在解析前从原始消息更新中获取其可能命中的所有路由键.
+        说明:
+            结果与解析后 get_message_routes 的结果一致或更多, 无法确定时返回 None.
+        """
+        message = getattr(update, "message", None)
+        peer = getattr(message, "peer_id", None)
+        if not peer:
+            return None
+        routes = []
+        raw_chat_id = utils.get_raw_peer_id(peer)
+        if isinstance(peer, raw.types.PeerUser):
+            chat = users.get(raw_chat_id, None)
+        else:
+            chat = chats.get(raw_chat_id, None)
+        if chat is None:
+            return None
+        routes.append(("chat", utils.get_peer_id(peer)))
+        username = getattr(chat, "username", None)
+        if not username and isinstance(chat, raw.types.User) and chat.usernames:
+            username = chat.usernames[0].username
+        if username:
+            routes.append(("chat", username.lower()))
+        raw_user_id = utils.get_raw_peer_id(message.from_id) or raw_chat_id
+        user = users.get(raw_user_id, None)
+        if user is None:
+            # 私聊中发送者不在更新内时, 解析过程会主动获取发送者.
+            if isinstance(message.from_id, raw.types.PeerUser) and isinstance(peer, raw.types.PeerUser):
+                return None
+        else:
+            routes.append(("user", raw_user_id))
+            username = getattr(user, "username", None)
+            if not username and getattr(user, "usernames", None):
+                username = user.usernames[0].username
+            if username:
+                routes.append(("user", username.lower()))
+        return routes
+
+    def select(self, routes: typing.Iterable[tuple]):
+        """获取命中路由键或无法索引的处理器, 按组和添加顺序排序."""
+        candidates = set(self.wildcards)
+        for r in routes:
+            entries = self.routes.get(r, None)
+            if entries:
+                candidates.update(entries)
+        return sorted(candidates)
+
+    def get_candidates(self, parsed_update):
+        """获取可能处理该更新的处理器, 按组和添加顺序排序."""
+        if not isinstance(parsed_update, types.Message):
+            return self.ordered
+        return self.select(self.get_message_routes(parsed_update))
+
+    def add(self, handler: Handler, group: int):
+        """返回增加了处理器的新版本."""
+        seq = self.seq + 1
+        entry = (group, seq, handler)
+        routes = None
+        if isinstance(handler, (MessageHandler, EditedMessageHandler)):
+            routes = self.get_routes(handler.filters)
+        entries = {**self.entries, (group, handler): (entry, routes)}
+        ordered = list(self.ordered)
+        bisect.insort(ordered, entry)
+        wildcards = self.wildcards
+        table_routes = self.routes
+        if routes is None:
+            wildcards = wildcards | {entry}
+        else:
+            table_routes = dict(table_routes)
+            for r in routes:
+                table_routes[r] = table_routes.get(r, frozenset()) | {entry}
+        return HandlerTable(self.version + 1, seq, entries, tuple(ordered), table_routes, wildcards)
+
+    def remove(self, handler: Handler, group: int):
+        """返回移除了处理器的新版本."""
+        entries = dict(self.entries)
+        try:
+            entry, routes = entries.pop((group, handler))
+        except KeyError:
+            raise ValueError(f"Handler was not found in group {group} and was not removed.") from None
+        ordered = tuple(e for e in self.ordered if e is not entry)
+        wildcards = self.wildcards
+        table_routes = self.routes
+        if routes is None:
+            wildcards = wildcards - {entry}
+        else:
+            table_routes = dict(table_routes)
+            for r in routes:
+                remaining = table_routes.get(r, frozenset()) - {entry}
+                if remaining:
+                    table_routes[r] = remaining
+                else:
+                    table_routes.pop(r, None)
+        return HandlerTable(self.version + 1, self.seq, entries, ordered, table_routes, wildcards)
+
+
+def get_update_chat_id(update) -> int:
+    """从原始更新中获取会话 ID, 无法获取时返回 0."""
+    message = getattr(update, "message", None)
+    peer = getattr(message, "peer_id", None) or getattr(update, "peer", None)
+    if isinstance(peer, (raw.types.PeerUser, raw.types.PeerChat, raw.types.PeerChannel)):
+        return utils.get_peer_id(peer)
+    channel_id = getattr(update, "channel_id", None)
+    if channel_id:
+        return utils.get_channel_id(channel_id)
+    user_id = getattr(update, "user_id", None)
+    if isinstance(user_id, int):
+        return user_id
+    return 0
+
+
+class DispatchShard:
+    """更新分片, 同一会话的更新总是由同一分片按顺序处理."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.queue = asyncio.Queue()
+        self.pending = {}  # chat_id: count
+        self.processed = 0
+        self.latency = 0.0  # 最近更新从入队到处理完毕的平滑耗时 (秒)
+
+    def put(self, chat_id: int, packet):
+        self.pending[chat_id] = self.pending.get(chat_id, 0) + 1
+        self.queue.put_nowait((time.perf_counter(), chat_id, packet))
+
+    def done(self, chat_id: int, queued: float):
+        count = self.pending.get(chat_id, 0) - 1
+        if count > 0:
+            self.pending[chat_id] = count
+        else:
+            self.pending.pop(chat_id, None)
+        self.processed += 1
+        self.latency = self.latency * 0.8 + (time.perf_counter() - queued) * 0.2
+
+    @property
+    def hot(self):
+        """返回积压最多的会话及其积压数."""
+        if not self.pending:
+            return None, 0
+        return max(self.pending.items(), key=lambda i: i[1])
+
+
 class Dispatcher(dispatcher.Dispatcher):
+    MESSAGE_UPDATES = dispatcher.Dispatcher.NEW_MESSAGE_UPDATES + dispatcher.Dispatcher.EDIT_MESSAGE_UPDATES
+
     updates_count = 0
+    skipped_count = 0  # 解析前即被判定为无处理器需要的更新数
 
     def __init__(self, client: Client):
         super().__init__(client)
-        self.mutex = asyncio.Lock()
+        self.table = HandlerTable()
+        self.shards: typing.List[DispatchShard] = []
+        self.router_task = None
 
     async def start(self):
         logger.debug("Telegram 更新分配器启动.")
         if not self.client.no_updates:
-            self.handler_worker_tasks = [
-                self.loop.create_task(self.handler_worker()) for _ in range(self.client.workers)
-            ]
+            shards = getattr(self.client, "dispatch_shards", 0)
+            if shards:
+                self.shards = [DispatchShard(i) for i in range(shards)]
+                self.handler_worker_tasks = [
+                    self.loop.create_task(self.shard_worker(shard)) for shard in self.shards
+                ]
+                self.router_task = self.loop.create_task(self.router())
+            else:
+                self.handler_worker_tasks = [
+                    self.loop.create_task(self.handler_worker()) for _ in range(self.client.workers)
+                ]
             if not self.client.skip_updates:
                 await self.client.recover_gaps()
 
-    def add_handler(self, handler, group: int):
-        async def fn():
-            async with self.mutex:
-                if group not in self.groups:
-                    self.groups[group] = []
-                    self.groups = OrderedDict(sorted(self.groups.items()))
-                self.groups[group].append(handler)
-                # logger.debug(f"增加了 Telegram 更新处理器: {handler.__class__.__name__}.")
+    async def stop(self, clear: bool = True):
+        await super().stop(clear=clear)
+        if self.router_task:
+            await self.router_task
+            self.router_task = None
+            # 基类按 workers 数量放入结束标记, 路由任务仅消费一个, 需清除其余标记以免重新启动后立即退出
+            packets = []
+            while not self.updates_queue.empty():
+                packet = self.updates_queue.get_nowait()
+                if packet is not None:
+                    packets.append(packet)
+            for packet in packets:
+                self.updates_queue.put_nowait(packet)
+        if clear:
+            self.table = HandlerTable()
+            self.shards = []
+
+    def _resolved(self, exception: Exception = None):
+        future = self.loop.create_future()
+        if exception:
+            future.set_exception(exception)
+        else:
+            future.set_result(None)
+        return future
 
-        return self.loop.create_task(fn())
+    def add_handler(self, handler, group: int):
+        self.table = self.table.add(handler, group)
+        # logger.debug(f"增加了 Telegram 更新处理器: {handler.__class__.__name__}.")
+        return self._resolved()
 
     def remove_handler(self, handler, group: int):
-        async def fn():
-            async with self.mutex:
-                if group not in self.groups:
-                    raise ValueError(f"Group {group} does not exist. Handler was not removed.")
-                self.groups[group].remove(handler)
-                # logger.debug(f"移除了 Telegram 更新处理器: {handler.__class__.__name__}.")
+        try:
+            self.table = self.table.remove(handler, group)
+        except ValueError as e:
+            return self._resolved(e)
+        # logger.debug(f"移除了 Telegram 更新处理器: {handler.__class__.__name__}.")
+        return self._resolved()
+
+    def get_shard_stats(self):
+        """返回各分片的状态: (分片序号, 队列长度, 积压最多的会话, 该会话积压数, 平滑耗时)."""
+        results = []
+        for shard in self.shards:
+            chat_id, depth = shard.hot
+            results.append((shard.index, shard.queue.qsize(), chat_id, depth, shard.latency))
+        return results
+
+    async def router(self):
+        """将更新按会话 ID 分配到各个分片, 保证同一会话内的更新按顺序处理."""
+        while True:
+            packet = await self.updates_queue.get()
+
+            if packet is None:
+                for shard in self.shards:
+                    shard.queue.put_nowait(None)
+                break
+
+            Dispatcher.updates_count += 1
+            chat_id = get_update_chat_id(packet[0])
+            self.shards[hash(chat_id) % len(self.shards)].put(chat_id, packet)
 
-        return self.loop.create_task(fn())
+    async def shard_worker(self, shard: DispatchShard):
+        while True:
+            item = await shard.queue.get()
+
+            if item is None:
+                break
+
+            queued, chat_id, packet = item
+            try:
+                await self.handle_packet(packet)
+            finally:
+                shard.done(chat_id, queued)
 
     async def handler_worker(self):
         while True:
@@ -159,70 +438,95 @@ class Dispatcher(dispatcher.Dispatcher):
             if packet is None:
                 break
 
-            try:
-                update, users, chats = packet
-                parser = self.update_parsers.get(type(update), None)
+            await self.handle_packet(packet)
+
+    async def handle_packet(self, packet):
+        try:
+            update, users, chats = packet
+            parser = self.update_parsers.get(type(update), None)
+
+            # 对于消息更新, 先根据原始更新中的会话和发送者筛选处理器, 仅在确有需要时才解析消息.
+            entries = None
+            if parser is not None and isinstance(update, self.MESSAGE_UPDATES):
+                routes = self.table.get_raw_message_routes(update, users, chats)
+                if routes is not None:
+                    entries = self.table.select(routes)
+                    if isinstance(update, self.EDIT_MESSAGE_UPDATES):
+                        handler_type = EditedMessageHandler
+                    else:
+                        handler_type = MessageHandler
+                    if not any(isinstance(h, (handler_type, RawUpdateHandler)) for _, _, h in entries):
+                        Dispatcher.skipped_count += 1
+                        return
+                    parsed_update = _UNPARSED
 
+            if entries is None:
                 try:
                     parsed_update, handler_type = (
                         await parser(update, users, chats) if parser is not None else (None, type(None))
                     )
                 except (ValueError, BadRequest):
-                    continue
+                    return
+                entries = self.table.get_candidates(parsed_update)
 
-                async with self.mutex:
-                    groups = {i: g[:] for i, g in self.groups.items()}
-
-                for group in groups.values():
-                    for handler in group:
-                        args = None
-
-                        if isinstance(handler, handler_type):
-                            try:
-                                if await handler.check(self.client, parsed_update):
-                                    args = (parsed_update,)
-                            except Exception as e:
-                                logger.warning(f"Telegram 错误: {e}")
-                                continue
-
-                        elif isinstance(handler, RawUpdateHandler):
-                            try:
-                                if await handler.check(self.client, update):
-                                    args = (update, users, chats)
-                            except Exception as e:
-                                logger.debug(f"更新回调函数内发生错误.")
-                                show_exception(e, regular=False)
-                        if args is None:
-                            continue
+            for _, _, handler in entries:
+                args = None
 
+                if isinstance(handler, handler_type):
+                    if parsed_update is _UNPARSED:
                         try:
-                            if inspect.iscoroutinefunction(handler.callback):
-                                await handler.callback(self.client, *args)
-                            else:
-                                await self.loop.run_in_executor(
-                                    self.client.executor, handler.callback, self.client, *args
-                                )
-                        except pyrogram.StopPropagation:
-                            raise
-                        except pyrogram.ContinuePropagation:
-                            continue
-                        except Exception as e:
-                            logger.error(f"更新回调函数内发生错误.")
-                            show_exception(e, regular=False)
-                        break
-                    else:
+                            parsed_update, _ = await parser(update, users, chats)
+                        except (ValueError, BadRequest):
+                            return
+                    try:
+                        if await handler.check(self.client, parsed_update):
+                            args = (parsed_update,)
+                    except Exception as e:
+                        logger.warning(f"Telegram 错误: {e}")
                         continue
-                    break
-            except pyrogram.StopPropagation:
-                pass
-            except TimeoutError:
-                logger.info("网络不稳定, 可能遗漏消息.")
-            except Exception as e:
-                logger.error("更新控制器错误.")
-                show_exception(e, regular=False)
+
+                elif isinstance(handler, RawUpdateHandler):
+                    try:
+                        if await handler.check(self.client, update):
+                            args = (update, users, chats)
+                    except Exception as e:
+                        logger.debug(f"更新回调函数内发生错误.")
+                        show_exception(e, regular=False)
+                if args is None:
+                    continue
+
+                try:
+                    if inspect.iscoroutinefunction(handler.callback):
+                        await handler.callback(self.client, *args)
+                    else:
+                        await self.loop.run_in_executor(
+                            self.client.executor, handler.callback, self.client, *args
+                        )
+                except pyrogram.StopPropagation:
+                    raise
+                except pyrogram.ContinuePropagation:
+                    continue
+                except Exception as e:
+                    logger.error(f"更新回调函数内发生错误.")
+                    show_exception(e, regular=False)
+                break
+        except pyrogram.StopPropagation:
+            pass
+        except TimeoutError:
+            logger.info("网络不稳定, 可能遗漏消息.")
+        except Exception as e:
+            logger.error("更新控制器错误.")
+            show_exception(e, regular=False)
 
 
 class FileStorage(SQLiteStorage):
+    """
+    基于文件的会话存储.
+    说明:
+        所有 sqlite 读写都在该存储专用的线程中按顺序执行, 不会阻塞事件循环.
+        数据库使用 WAL 模式, 整理 (VACUUM) 需要通过 vacuum 显式执行.
+    """
+
     FILE_EXTENSION = ".session"
 
     def __init__(self, name: str, workdir: Path, session_string: str = None):
@@ -230,6 +534,13 @@ class FileStorage(SQLiteStorage):
 
         self.database = workdir / (self.name + self.FILE_EXTENSION)
         self.session_string = session_string
+        self.executor: ThreadPoolExecutor = None
+
+    async def _run(self, func, *args):
+        """在存储线程中执行函数."""
+        if not self.executor:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"storage-{self.name}")
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
 
     def update(self):
         version = self.version()
@@ -266,14 +577,21 @@ class FileStorage(SQLiteStorage):
 
         self.version(version)
 
-    async def open(self):
-        path = self.database
-        file_exists = path.is_file()
+    def _open(self):
+        file_exists = self.database.is_file()
+        self.conn = sqlite3.connect(str(self.database), timeout=1, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if not file_exists:
+            self.create()
+        else:
+            self.update()
+        return file_exists
 
-        self.conn = sqlite3.connect(str(path), timeout=1, check_same_thread=False)
+    async def open(self):
+        file_exists = await self._run(self._open)
 
         if not file_exists:
-            self.create()
             if self.session_string:
                 # Old format
                 if len(self.session_string) in [self.SESSION_STRING_SIZE, self.SESSION_STRING_SIZE_64]:
@@ -310,26 +628,767 @@ class FileStorage(SQLiteStorage):
                 await self.user_id(user_id)
                 await self.is_bot(is_bot)
                 await self.date(0)
-        else:
-            self.update()
 
+    def _vacuum(self):
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    async def vacuum(self):
+        """整理数据库文件, 回收已删除数据占用的空间."""
+        await self._run(self._vacuum)
+
+    def _save(self):
         with self.conn:
-            self.conn.execute("VACUUM")
+            self.conn.execute("UPDATE sessions SET date = ?", (int(time.time()),))
+
+    async def save(self):
+        await self._run(self._save)
+
+    async def close(self):
+        if not self.executor:
+            return
+        if self.conn:
+            await self._run(self.conn.close)
+        self.executor.shutdown(wait=False)
+        self.executor = None
 
     async def delete(self):
         os.remove(self.database)
+        for suffix in ("-wal", "-shm"):
+            Path(f"{self.database}{suffix}").unlink(missing_ok=True)
+
+    def _execute(self, sql: str, params=(), fetch: str = None):
+        cursor = self.conn.execute(sql, params)
+        if fetch == "one":
+            return cursor.fetchone()
+        elif fetch == "all":
+            return cursor.fetchall()
+
+    def _executemany(self, *statements: typing.Tuple[str, typing.Iterable], commit: bool = False):
+        if commit:
+            with self.conn:
+                for sql, params in statements:
+                    self.conn.executemany(sql, params)
+        else:
+            for sql, params in statements:
+                self.conn.executemany(sql, params)
+
+    async def update_peers(self, peers: typing.List[typing.Tuple[int, int, str, str]]):
+        await self._run(
+            self._executemany,
+            ("REPLACE INTO peers (id, access_hash, type, phone_number) VALUES (?, ?, ?, ?)", peers),
+        )
+
+    async def update_usernames(self, usernames: typing.List[typing.Tuple[int, typing.List[str]]]):
+        await self._run(
+            self._executemany,
+            ("DELETE FROM usernames WHERE id = ?", [(id,) for id, _ in usernames]),
+            (
+                "REPLACE INTO usernames (id, username) VALUES (?, ?)",
+                [(id, username) for id, names in usernames for username in names],
+            ),
+        )
+
+    async def update_state(self, value: typing.Tuple[int, int, int, int, int] = object):
+        if value == object:
+            return await self._run(
+                self._execute, "SELECT id, pts, qts, date, seq FROM update_state ORDER BY date ASC", (), "all"
+            )
+        elif isinstance(value, int):
+            await self._run(self._execute, "DELETE FROM update_state WHERE id = ?", (value,))
+        else:
+            await self._run(
+                self._execute,
+                "REPLACE INTO update_state (id, pts, qts, date, seq) VALUES (?, ?, ?, ?, ?)",
+                value,
+            )
+
+    async def update_states(self, values: typing.List[typing.Tuple[int, int, int, int, int]]):
+        await self._run(
+            functools.partial(
+                self._executemany,
+                ("REPLACE INTO update_state (id, pts, qts, date, seq) VALUES (?, ?, ?, ?, ?)", values),
+                commit=True,
+            )
+        )
+
+    async def get_peer_by_id(self, peer_id: int):
+        r = await self._run(
+            self._execute, "SELECT id, access_hash, type FROM peers WHERE id = ?", (peer_id,), "one"
+        )
+        if r is None:
+            raise KeyError(f"ID not found: {peer_id}")
+        return get_input_peer(*r)
+
+    async def get_peer_by_username(self, username: str):
+        r = await self._run(
+            self._execute,
+            "SELECT p.id, p.access_hash, p.type, p.last_update_on FROM peers p "
+            "JOIN usernames u ON p.id = u.id "
+            "WHERE u.username = ? "
+            "ORDER BY p.last_update_on DESC",
+            (username,),
+            "one",
+        )
+        if r is None:
+            raise KeyError(f"Username not found: {username}")
+        if abs(time.time() - r[3]) > self.USERNAME_TTL:
+            raise KeyError(f"Username expired: {username}")
+        return get_input_peer(*r[:3])
+
+    async def get_peer_by_phone_number(self, phone_number: str):
+        r = await self._run(
+            self._execute,
+            "SELECT id, access_hash, type FROM peers WHERE phone_number = ?",
+            (phone_number,),
+            "one",
+        )
+        if r is None:
+            raise KeyError(f"Phone number not found: {phone_number}")
+        return get_input_peer(*r)
+
+    def _access(self, attr: str, value: typing.Any):
+        if value == object:
+            return self.conn.execute(f"SELECT {attr} FROM sessions").fetchone()[0]
+        else:
+            with self.conn:
+                self.conn.execute(f"UPDATE sessions SET {attr} = ?", (value,))
+
+    async def dc_id(self, value: int = object):
+        return await self._run(self._access, "dc_id", value)
+
+    async def api_id(self, value: int = object):
+        return await self._run(self._access, "api_id", value)
+
+    async def test_mode(self, value: bool = object):
+        return await self._run(self._access, "test_mode", value)
+
+    async def auth_key(self, value: bytes = object):
+        return await self._run(self._access, "auth_key", value)
+
+    async def date(self, value: int = object):
+        return await self._run(self._access, "date", value)
+
+    async def user_id(self, value: int = object):
+        return await self._run(self._access, "user_id", value)
+
+    async def is_bot(self, value: bool = object):
+        return await self._run(self._access, "is_bot", value)
+
+
+SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions
+(
+    account   TEXT PRIMARY KEY,
+    dc_id     INTEGER,
+    api_id    INTEGER,
+    test_mode INTEGER,
+    auth_key  BLOB,
+    date      INTEGER NOT NULL,
+    user_id   INTEGER,
+    is_bot    INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS peers
+(
+    account        TEXT NOT NULL,
+    id             INTEGER NOT NULL,
+    access_hash    INTEGER,
+    type           TEXT NOT NULL,
+    phone_number   TEXT,
+    last_update_on INTEGER NOT NULL DEFAULT (CAST(STRFTIME('%s', 'now') AS INTEGER)),
+    PRIMARY KEY (account, id)
+);
+
+CREATE TABLE IF NOT EXISTS usernames
+(
+    account  TEXT NOT NULL,
+    id       INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    PRIMARY KEY (account, id, username)
+);
+
+CREATE TABLE IF NOT EXISTS update_state
+(
+    account TEXT NOT NULL,
+    id      INTEGER NOT NULL,
+    pts     INTEGER,
+    qts     INTEGER,
+    date    INTEGER,
+    seq     INTEGER,
+    PRIMARY KEY (account, id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_peers_phone_number ON peers (account, phone_number);
+CREATE INDEX IF NOT EXISTS idx_usernames_username ON usernames (account, username);
+"""
+
+
+class SharedFileStorage(FileStorage):
+    """
+    多账号共享的单文件会话存储.
+    说明:
+        所有账号的会话, 实体, 用户名和更新状态保存在同一个 WAL 模式的 sqlite 数据库中, 以账号名区分.
+        同一数据库的所有账号共用一个连接和一个读写线程.
+        实体的 access_hash 因账号而异, 因此实体表以 (账号, ID) 为主键.
+    """
+
+    DATABASE = "sessions.db"
+
+    connections = {}  # database: [conn, executor, refs]
+
+    def __init__(self, name: str, workdir: Path, session_string: str = None):
+        super().__init__(name, workdir, session_string)
+        self.database = workdir / self.DATABASE
+
+    @classmethod
+    async def exists(cls, workdir: Path, name: str):
+        """检查共享数据库中是否存在该账号的会话."""
+
+        def _exists():
+            database = Path(workdir) / cls.DATABASE
+            if not database.is_file():
+                return False
+            conn = sqlite3.connect(f"{database.resolve().as_uri()}?mode=ro", uri=True, timeout=1)
+            try:
+                return bool(
+                    conn.execute(
+                        "SELECT 1 FROM sessions WHERE account = ? AND auth_key IS NOT NULL", (name,)
+                    ).fetchone()
+                )
+            except sqlite3.OperationalError:
+                return False
+            finally:
+                conn.close()
+
+        return await asyncio.get_running_loop().run_in_executor(None, _exists)
+
+    def _shared(self):
+        entry = self.connections.get(str(self.database))
+        if not entry:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-shared")
+            entry = self.connections[str(self.database)] = [None, executor, 0]
+        return entry
+
+    async def _run(self, func, *args):
+        if not self.executor:
+            self.executor = self._shared()[1]
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _open(self):
+        entry = self._shared()
+        if not entry[0]:
+            conn = sqlite3.connect(str(self.database), timeout=1, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.executescript(SHARED_SCHEMA)
+            entry[0] = conn
+        self.conn = entry[0]
+        exists = self.conn.execute("SELECT 1 FROM sessions WHERE account = ?", (self.name,)).fetchone()
+        if not exists:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO sessions (account, dc_id, date) VALUES (?, ?, ?)", (self.name, 2, 0)
+                )
+        return bool(exists)
+
+    async def open(self):
+        self._shared()[2] += 1
+        await super().open()
+
+    def _save(self):
+        with self.conn:
+            self.conn.execute("UPDATE sessions SET date = ? WHERE account = ?", (int(time.time()), self.name))
+
+    async def close(self):
+        if not self.executor:
+            return
+        self.executor = None
+        self.conn = None
+        entry = self.connections.get(str(self.database))
+        if not entry:
+            return
+        entry[2] -= 1
+        if entry[2] <= 0:
+            self.connections.pop(str(self.database), None)
+            conn, executor, _ = entry
+            if conn:
+                await asyncio.get_running_loop().run_in_executor(executor, conn.close)
+            executor.shutdown(wait=False)
+
+    def _delete(self):
+        with self.conn:
+            for table in ("sessions", "peers", "usernames", "update_state"):
+                self.conn.execute(f"DELETE FROM {table} WHERE account = ?", (self.name,))
+
+    async def delete(self):
+        opened = bool(self.conn)
+        if not opened:
+            await self.open()
+        await self._run(self._delete)
+        if not opened:
+            await self.close()
+
+    async def update_peers(self, peers: typing.List[typing.Tuple[int, int, str, str]]):
+        await self._run(
+            self._executemany,
+            (
+                "REPLACE INTO peers (account, id, access_hash, type, phone_number) VALUES (?, ?, ?, ?, ?)",
+                [(self.name, *p) for p in peers],
+            ),
+        )
+
+    async def update_usernames(self, usernames: typing.List[typing.Tuple[int, typing.List[str]]]):
+        await self._run(
+            self._executemany,
+            ("DELETE FROM usernames WHERE account = ? AND id = ?", [(self.name, id) for id, _ in usernames]),
+            (
+                "REPLACE INTO usernames (account, id, username) VALUES (?, ?, ?)",
+                [(self.name, id, username) for id, names in usernames for username in names],
+            ),
+        )
+
+    async def update_state(self, value: typing.Tuple[int, int, int, int, int] = object):
+        if value == object:
+            return await self._run(
+                self._execute,
+                "SELECT id, pts, qts, date, seq FROM update_state WHERE account = ? ORDER BY date ASC",
+                (self.name,),
+                "all",
+            )
+        elif isinstance(value, int):
+            await self._run(
+                self._execute, "DELETE FROM update_state WHERE account = ? AND id = ?", (self.name, value)
+            )
+        else:
+            await self._run(
+                self._execute,
+                "REPLACE INTO update_state (account, id, pts, qts, date, seq) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.name, *value),
+            )
+
+    async def update_states(self, values: typing.List[typing.Tuple[int, int, int, int, int]]):
+        await self._run(
+            functools.partial(
+                self._executemany,
+                (
+                    "REPLACE INTO update_state (account, id, pts, qts, date, seq) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(self.name, *v) for v in values],
+                ),
+                commit=True,
+            )
+        )
+
+    async def get_peer_by_id(self, peer_id: int):
+        r = await self._run(
+            self._execute,
+            "SELECT id, access_hash, type FROM peers WHERE account = ? AND id = ?",
+            (self.name, peer_id),
+            "one",
+        )
+        if r is None:
+            raise KeyError(f"ID not found: {peer_id}")
+        return get_input_peer(*r)
+
+    async def get_peer_by_username(self, username: str):
+        r = await self._run(
+            self._execute,
+            "SELECT p.id, p.access_hash, p.type, p.last_update_on FROM peers p "
+            "JOIN usernames u ON p.account = u.account AND p.id = u.id "
+            "WHERE u.account = ? AND u.username = ? "
+            "ORDER BY p.last_update_on DESC",
+            (self.name, username),
+            "one",
+        )
+        if r is None:
+            raise KeyError(f"Username not found: {username}")
+        if abs(time.time() - r[3]) > self.USERNAME_TTL:
+            raise KeyError(f"Username expired: {username}")
+        return get_input_peer(*r[:3])
+
+    async def get_peer_by_phone_number(self, phone_number: str):
+        r = await self._run(
+            self._execute,
+            "SELECT id, access_hash, type FROM peers WHERE account = ? AND phone_number = ?",
+            (self.name, phone_number),
+            "one",
+        )
+        if r is None:
+            raise KeyError(f"Phone number not found: {phone_number}")
+        return get_input_peer(*r)
+
+    def _access(self, attr: str, value: typing.Any):
+        if value == object:
+            return self.conn.execute(
+                f"SELECT {attr} FROM sessions WHERE account = ?", (self.name,)
+            ).fetchone()[0]
+        else:
+            with self.conn:
+                self.conn.execute(f"UPDATE sessions SET {attr} = ? WHERE account = ?", (value, self.name))
+
+
+class UpdateStateBuffer:
+    """更新状态延迟写入缓冲, 合并同一会话的 pts/qts/date/seq 并定时在一个事务中批量写入."""
+
+    def __init__(self, storage: Storage, interval: float = 5):
+        self.storage = storage
+        self.interval = interval
+        self.states = {}  # id: (id, pts, qts, date, seq)
+        self.timer: asyncio.TimerHandle = None
+        self.flushing: asyncio.Task = None
+
+    def put(self, state: typing.Tuple[int, int, int, int, int]):
+        """缓存一个更新状态, 同一会话的状态仅保留最新的一个."""
+        self.states[state[0]] = state
+        if not self.timer:
+            loop = asyncio.get_running_loop()
+            self.timer = loop.call_later(self.interval, self._schedule)
+
+    def _schedule(self):
+        self.timer = None
+        self.flushing = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """立即写入所有缓存的更新状态."""
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        if not self.states:
+            return
+        states, self.states = self.states, {}
+        values = list(states.values())
+        try:
+            if hasattr(self.storage, "update_states"):
+                await self.storage.update_states(values)
+            else:
+                for v in values:
+                    await self.storage.update_state(v)
+        except Exception as e:
+            logger.debug(f"写入更新状态时发生错误.")
+            show_exception(e, regular=False)
+
+
+async def single_flight(flights: dict, key, func, *args):
+    """合并相同键的并发请求, 仅执行一次 func, 所有调用者共享其结果或异常."""
+    task: asyncio.Task = flights.get(key, None)
+    if not task:
+        task = flights[key] = asyncio.create_task(func(*args))
+
+        def done(t: asyncio.Task):
+            if flights.get(key, None) is t:
+                del flights[key]
+            # 所有调用者均已取消时避免未读取异常的警告
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(done)
+    return await asyncio.shield(task)
+
+
+class ChatMemberCache:
+    """
+    进程内共享的群组成员身份缓存, 以 (会话 ID, 用户 ID) 为键.
+    说明:
+        判断管理员时, 每个群组仅通过一次管理员列表请求预填充, 之后根据成员变更更新维护.
+        同一键的并发查询合并为一次请求, 不同键的查询互不阻塞.
+        账号自身的成员身份不缓存, 因为普通账号退出或被移出群组时通常收不到成员变更更新.
+    """
+
+    ADMIN_STATUSES = (ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER)
+    ADMIN_PARTICIPANTS = (
+        raw.types.ChannelParticipantAdmin,
+        raw.types.ChannelParticipantCreator,
+        raw.types.ChatParticipantAdmin,
+        raw.types.ChatParticipantCreator,
+    )
+
+    statuses = TTLCache(maxsize=65536, ttl=86400)  # (chat_id, user_id): ChatMemberStatus
+    admins = TTLCache(maxsize=4096, ttl=86400)  # chat_id: {user_id}
+    admins_failed = TTLCache(maxsize=4096, ttl=600)  # chat_id: 无权获取管理员列表的群组
+    flights = {}  # key: task
+
+    @classmethod
+    async def get_status(cls, client: Client, chat_id: int, user_id: int) -> ChatMemberStatus:
+        """获取用户在群组中的身份, 用户不在群组中时抛出 UserNotParticipant."""
+        own = user_id == client.me.id
+        status = None if own else cls.statuses.get((chat_id, user_id), None)
+        if status is None:
+            status = await single_flight(
+                cls.flights, (chat_id, user_id), cls._fetch, client, chat_id, user_id, not own
+            )
+        return status
+
+    @classmethod
+    async def is_admin(cls, client: Client, chat_id: int, user_id: int) -> bool:
+        """判断用户是否为群组管理员或所有者."""
+        admins = cls.admins.get(chat_id, None)
+        if admins is None and chat_id not in cls.admins_failed:
+            try:
+                admins = await single_flight(
+                    cls.flights, ("admins", chat_id), cls._load_admins, client, chat_id
+                )
+            except RPCError:
+                cls.admins_failed[chat_id] = True
+                admins = None
+        if admins is not None:
+            return user_id in admins
+        return await cls.get_status(client, chat_id, user_id) in cls.ADMIN_STATUSES
+
+    @classmethod
+    async def _fetch(cls, client: Client, chat_id: int, user_id: int, cache: bool = True):
+        member = await client.get_chat_member(chat_id, user_id)
+        if cache:
+            cls.statuses[(chat_id, user_id)] = member.status
+        return member.status
+
+    @classmethod
+    async def _load_admins(cls, client: Client, chat_id: int):
+        admins = set()
+        async for member in client.get_chat_members(chat_id, filter=ChatMembersFilter.ADMINISTRATORS):
+            if member.user:
+                admins.add(member.user.id)
+                cls.statuses[(chat_id, member.user.id)] = member.status
+        cls.admins[chat_id] = admins
+        return admins
+
+    @classmethod
+    def feed(cls, update):
+        """根据成员变更更新维护缓存."""
+        if isinstance(update, raw.types.UpdateChannel):
+            # 群组权限或账号自身的成员身份变化, 重新获取管理员列表
+            chat_id = utils.get_channel_id(update.channel_id)
+            cls.admins.pop(chat_id, None)
+            cls.admins_failed.pop(chat_id, None)
+            return
+        elif isinstance(update, raw.types.UpdateChannelParticipant):
+            chat_id = utils.get_channel_id(update.channel_id)
+        elif isinstance(update, raw.types.UpdateChatParticipant):
+            chat_id = -update.chat_id
+        else:
+            return
+        cls.statuses.pop((chat_id, update.user_id), None)
+        admins = cls.admins.get(chat_id, None)
+        if admins is not None:
+            if isinstance(update.new_participant, cls.ADMIN_PARTICIPANTS):
+                admins.add(update.user_id)
+            else:
+                admins.discard(update.user_id)
+
+
+class LookupCache:
+    """
+    会话和用户的查询缓存, 用于 get_chat / get_users / resolve_peer.
+    说明:
+        相同的并发查询合并为一次请求, 结果缓存 ttl 秒, 收到相关会话或用户的变更更新时失效.
+        resolve_peer 仅缓存本地存储中不存在的用户名, 其余情况由本地存储直接解析, 不计入统计.
+    """
+
+    ttl = 300
+    hits = 0  # 命中缓存的查询数
+    coalesced = 0  # 合并到进行中请求的查询数
+    requests = 0  # 实际发出的请求数
+
+    def __init__(self):
+        self.entries = TTLCache(maxsize=4096, ttl=self.ttl)  # (kind, ident): result
+        self.keys = TTLCache(maxsize=4096, ttl=self.ttl)  # peer_id: {(kind, ident)}
+        self.flights = {}  # (kind, ident): task
+
+    @staticmethod
+    def key(kind: str, ident: Union[int, str]):
+        if isinstance(ident, str):
+            ident = ident.strip()
+            # 用户名不区分大小写, 邀请链接等其他字符串保持原样
+            if re.fullmatch(r"@?\w+", ident):
+                ident = ident.lstrip("@").lower()
+        return (kind, ident)
+
+    @staticmethod
+    def is_username(ident):
+        if not isinstance(ident, str):
+            return False
+        ident = ident.strip().lstrip("@").lower()
+        return ident not in ("me", "self") and bool(re.fullmatch(r"[a-z]\w{3,}", ident))
+
+    async def get(self, kind: str, ident: Union[int, str], func):
+        key = self.key(kind, ident)
+        result = self.entries.get(key, None)
+        if result is not None:
+            LookupCache.hits += 1
+            return result
+        if key in self.flights:
+            LookupCache.coalesced += 1
+        else:
+            LookupCache.requests += 1
+        return await single_flight(self.flights, key, self._fetch, key, func, ident)
+
+    async def _fetch(self, key, func, ident):
+        result = await func(ident)
+        self.entries[key] = result
+        for peer_id in (ident, self.get_peer_id(result)):
+            if isinstance(peer_id, int):
+                # 重新赋值以刷新过期时间, 保证索引不早于缓存条目过期
+                self.keys[peer_id] = self.keys.get(peer_id, set()) | {key}
+        return result
+
+    @staticmethod
+    def get_peer_id(result):
+        if isinstance(result, raw.types.InputPeerUser):
+            return result.user_id
+        elif isinstance(result, raw.types.InputPeerChannel):
+            return utils.get_channel_id(result.channel_id)
+        elif isinstance(result, raw.types.InputPeerChat):
+            return -result.chat_id
+        return getattr(result, "id", None)
+
+    def invalidate(self, peer_id: int):
+        for key in self.keys.pop(peer_id, ()):
+            self.entries.pop(key, None)
+
+    def feed(self, update):
+        """根据会话和用户的变更更新使缓存失效."""
+        if isinstance(update, raw.types.UpdateChannel):
+            peer_id = utils.get_channel_id(update.channel_id)
+        elif isinstance(update, (raw.types.UpdateUser, raw.types.UpdateUserName)):
+            peer_id = update.user_id
+        elif isinstance(update, raw.types.UpdateChatParticipants):
+            peer_id = -update.participants.chat_id
+        elif isinstance(update, raw.types.UpdateChatDefaultBannedRights):
+            peer_id = utils.get_peer_id(update.peer)
+        else:
+            return
+        self.invalidate(peer_id)
+
+
+class DialogEntry(typing.NamedTuple):
+    folder_id: int  # 0 为主列表, 1 为归档
+    top_message: int
+
+    @property
+    def archived(self):
+        return self.folder_id == 1
+
+
+class DialogIndex:
+    """
+    账号会话索引, 以会话 ID 记录所在文件夹和最新消息 ID.
+    说明:
+        每次登录后首次查询时通过原始 GetDialogs 请求建立, 不解析会话和消息对象,
+        之后根据新消息和归档变更的更新增量维护.
+    """
+
+    FOLDERS = (0, 1)
+
+    def __init__(self, client: Client, limit: int = 100):
+        self.client = client
+        self.limit = limit
+        self.dialogs: typing.Dict[int, DialogEntry] = {}
+        self.moved: typing.Set[int] = set()  # 建立期间通过更新变更了文件夹的会话
+        self.ready = False
+        self.lock = asyncio.Lock()
+
+    async def get(self, chat_id: int) -> Optional[DialogEntry]:
+        """获取会话信息, 未与该会话交流过时返回 None."""
+        if not self.ready:
+            async with self.lock:
+                if not self.ready:
+                    await self.build()
+        return self.dialogs.get(chat_id, None)
+
+    async def build(self):
+        """遍历主列表和归档中的所有会话, 建立索引."""
+        dialogs = {}
+        for folder_id in self.FOLDERS:
+            offset_id, offset_date, offset_peer = 0, 0, raw.types.InputPeerEmpty()
+            while True:
+                r = await self.client.invoke(
+                    raw.functions.messages.GetDialogs(
+                        offset_date=offset_date,
+                        offset_id=offset_id,
+                        offset_peer=offset_peer,
+                        limit=self.limit,
+                        hash=0,
+                        folder_id=folder_id,
+                    ),
+                    sleep_threshold=60,
+                )
+                dates = {
+                    (utils.get_peer_id(m.peer_id), m.id): m.date
+                    for m in r.messages
+                    if not isinstance(m, raw.types.MessageEmpty)
+                }
+                last = None
+                for dialog in r.dialogs:
+                    if not isinstance(dialog, raw.types.Dialog):
+                        continue
+                    chat_id = utils.get_peer_id(dialog.peer)
+                    if chat_id in dialogs:
+                        continue
+                    dialogs[chat_id] = DialogEntry(folder_id, dialog.top_message)
+                    last = (chat_id, dialog.top_message)
+                if not last or isinstance(r, raw.types.messages.Dialogs) or len(r.dialogs) < self.limit:
+                    break
+                chat_id, offset_id = last
+                offset_date = dates.get(last, 0)
+                offset_peer = await self.client.resolve_peer(chat_id)
+        # 合并建立期间通过更新记录的会话, 文件夹以请求结果为准, 除非期间收到了文件夹变更
+        for chat_id, entry in self.dialogs.items():
+            built = dialogs.get(chat_id, None)
+            if not built:
+                dialogs[chat_id] = entry
+            else:
+                folder_id = entry.folder_id if chat_id in self.moved else built.folder_id
+                dialogs[chat_id] = DialogEntry(folder_id, max(entry.top_message, built.top_message))
+        self.dialogs = dialogs
+        self.moved.clear()
+        self.ready = True
+        logger.debug(f"已建立会话索引, 共 {len(dialogs)} 个会话.")
+
+    def feed(self, update):
+        """根据更新维护索引."""
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            message = update.message
+            if isinstance(message, raw.types.MessageEmpty):
+                return
+            self.touch(utils.get_peer_id(message.peer_id), message.id)
+        elif isinstance(update, raw.types.UpdateShortMessage):
+            self.touch(update.user_id, update.id)
+        elif isinstance(update, raw.types.UpdateShortChatMessage):
+            self.touch(-update.chat_id, update.id)
+        elif isinstance(update, raw.types.UpdateFolderPeers):
+            for fp in update.folder_peers:
+                chat_id = utils.get_peer_id(fp.peer)
+                if not self.ready:
+                    self.moved.add(chat_id)
+                entry = self.dialogs.get(chat_id, None)
+                self.dialogs[chat_id] = DialogEntry(fp.folder_id, entry.top_message if entry else 0)
+
+    def touch(self, chat_id: int, message_id: int):
+        entry = self.dialogs.get(chat_id, None)
+        if not entry:
+            self.dialogs[chat_id] = DialogEntry(0, message_id)
+        elif message_id > entry.top_message:
+            self.dialogs[chat_id] = entry._replace(top_message=message_id)
 
 
 class Client(pyrogram.Client):
-    def __init__(self, *args, **kw):
+    def __init__(self, *args, dispatch_shards: int = 0, shared_session: bool = False, **kw):
         super().__init__(*args, **kw)
+        self.dispatch_shards = dispatch_shards
         self.cache = Cache()
         self.lock = asyncio.Lock()
         self.dispatcher = Dispatcher(self)
         if self.in_memory:
             self.storage = MemoryStorage(self.name, self.session_string)
+        elif shared_session:
+            self.storage = SharedFileStorage(self.name, self.workdir, self.session_string)
         else:
             self.storage = FileStorage(self.name, self.workdir, self.session_string)
+        self.state_buffer = UpdateStateBuffer(self.storage)
+        self.dialog_index = DialogIndex(self)
+        self.lookups = LookupCache()
+        self.prompting = False  # 是否正在等待交互输入
         self._config_index: int = None
 
     async def authorize(self):
@@ -353,7 +1412,7 @@ class Client(pyrogram.Client):
                     else:
                         msg = f'请从{code_target[sent_code.type]}接收 "{self.phone_number}" 的登录验证码 (按回车确认)'
                     try:
-                        self.phone_code = Prompt.ask(" " * 23 + msg, console=var.console)
+                        self.phone_code = await self.ask(msg)
                     except EOFError:
                         raise BadRequest(
                             f'登录 "{self.phone_number}" 时出现异常: 您正在使用非交互式终端, 无法输入验证码.'
@@ -370,14 +1429,15 @@ class Client(pyrogram.Client):
                             msg = f'密码错误, 请重新输入 "{self.phone_number}" 的两步验证密码 (不显示, 按回车确认)'
                         else:
                             msg = f'需要输入 "{self.phone_number}" 的两步验证密码 (不显示, 按回车确认)'
-                        self.password = Prompt.ask(" " * 23 + msg, password=True, console=var.console)
+                        self.password = await self.ask(msg, password=True)
                     try:
                         return await self.check_password(self.password)
                     except BadRequest:
                         self.password = None
                         retry = True
             except FloodWait:
-                raise BadRequest(f'登录 "{self.phone_number}" 时出现异常: 登录过于频繁.')
+                # 由 ClientsSession 设置所有账号共享的等待时间
+                raise
             except PhoneNumberInvalid:
                 raise BadRequest(
                     f'登录 "{self.phone_number}" 时出现异常: 您使用了错误的手机号 (格式错误或没有注册).'
@@ -395,6 +1455,16 @@ class Client(pyrogram.Client):
         else:
             raise BadRequest("该账户尚未注册")
 
+    async def ask(self, msg: str, **kw):
+        """在线程中请求终端输入, 避免阻塞事件循环, 多个账号的输入依次进行."""
+        self.prompting = True
+        try:
+            async with ClientsSession.interactive_lock:
+                func = functools.partial(Prompt.ask, " " * 23 + msg, console=var.console, **kw)
+                return await asyncio.get_running_loop().run_in_executor(None, func)
+        finally:
+            self.prompting = False
+
     def add_handler(self, handler: Handler, group: int = 0):
         if isinstance(handler, DisconnectHandler):
             self.disconnect_handler = handler.callback
@@ -496,6 +1566,24 @@ class Client(pyrogram.Client):
                     if current >= total:
                         return
 
+    async def get_chat(self, chat_id: Union[int, str], force_full: bool = True):
+        if not force_full:
+            return await super().get_chat(chat_id, force_full=False)
+        return await self.lookups.get("chat", chat_id, super().get_chat)
+
+    async def get_users(self, user_ids):
+        if not isinstance(user_ids, (int, str)):
+            return await super().get_users(user_ids)
+        return await self.lookups.get("user", user_ids, super().get_users)
+
+    async def resolve_peer(self, peer_id: Union[int, str]):
+        if not LookupCache.is_username(peer_id):
+            return await super().resolve_peer(peer_id)
+        try:
+            return await self.storage.get_peer_by_username(LookupCache.key("peer", peer_id)[1])
+        except KeyError:
+            return await self.lookups.get("peer", peer_id, super().resolve_peer)
+
     @asynccontextmanager
     async def catch_reply(self, chat_id: Union[int, str], outgoing=False, filter=None):
         async def handler_func(client, message, future: asyncio.Future):
@@ -591,6 +1679,14 @@ class Client(pyrogram.Client):
             )
         )
 
+    async def recover_gaps(self):
+        await self.state_buffer.flush()
+        return await super().recover_gaps()
+
+    async def disconnect(self):
+        await self.state_buffer.flush()
+        return await super().disconnect()
+
     async def handle_updates(self, updates):
         if isinstance(updates, (raw.types.Updates, raw.types.UpdatesCombined)):
             is_min = any(
@@ -612,7 +1708,7 @@ class Client(pyrogram.Client):
                 pts_count = getattr(update, "pts_count", None)
 
                 if pts and not self.skip_updates:
-                    await self.storage.update_state(
+                    self.state_buffer.put(
                         (
                             utils.get_channel_id(channel_id) if channel_id else 0,
                             pts,
@@ -649,10 +1745,14 @@ class Client(pyrogram.Client):
                                 users.update({u.id: u for u in diff.users})
                                 chats.update({c.id: c for c in diff.chats})
 
+                self.dialog_index.feed(update)
+                self.lookups.feed(update)
+                ChatMemberCache.feed(update)
                 self.dispatcher.updates_queue.put_nowait((update, users, chats))
         elif isinstance(updates, (raw.types.UpdateShortMessage, raw.types.UpdateShortChatMessage)):
+            self.dialog_index.feed(updates)
             if not self.skip_updates:
-                await self.storage.update_state((0, updates.pts, None, updates.date, None))
+                self.state_buffer.put((0, updates.pts, None, updates.date, None))
 
             diff = await self.invoke(
                 raw.functions.updates.GetDifference(
@@ -676,6 +1776,9 @@ class Client(pyrogram.Client):
                 if diff.other_updates:  # The other_updates list can be empty
                     self.dispatcher.updates_queue.put_nowait((diff.other_updates[0], {}, {}))
         elif isinstance(updates, raw.types.UpdateShort):
+            self.dialog_index.feed(updates.update)
+            self.lookups.feed(updates.update)
+            ChatMemberCache.feed(updates.update)
             self.dispatcher.updates_queue.put_nowait((updates.update, {}, {}))
 
 
@@ -854,6 +1957,11 @@ class ClientsSession:
     pool = {}
     lock = asyncio.Lock()
     watch = None
+    login_concurrent = 10  # 同时进行登录的账号数
+    login_semaphore: asyncio.Semaphore = None
+    interactive_lock = asyncio.Lock()  # 需要输入验证码的登录依次进行
+    flood_until = 0  # 所有账号暂停登录直到该时间 (monotonic)
+    flood_max = 600  # 超过该等待时间的账号将被跳过
 
     @classmethod
     def from_config(cls, config, in_memory=False, quiet=False, **kw):
@@ -866,6 +1974,8 @@ class ClientsSession:
             basedir=config.get("basedir", None),
             in_memory=in_memory,
             quiet=quiet,
+            dispatch_shards=config.get("dispatch_shards", 0),
+            shared_session=config.get("shared_session", False),
         )
 
     @classmethod
@@ -926,19 +2036,33 @@ class ClientsSession:
                         await t
                     except asyncio.CancelledError:
                         pass
+                await client.state_buffer.flush()
         while len(asyncio.all_tasks()) > 1:
             await asyncio.sleep(0.1)
         print(f"Telegram 账号池停止.\r", end="", file=sys.stderr)
         for v in cls.pool.values():
             if isinstance(v, tuple):
                 client: Client = v[0]
+                await client.state_buffer.flush()
                 await client.storage.save()
                 await client.storage.close()
                 logger.debug(f'登出账号 "{client.phone_number}".')
+        await HTTPPool.close()
 
-    def __init__(self, accounts, proxy=None, basedir=None, in_memory=False, quiet=False):
+    def __init__(
+        self,
+        accounts,
+        proxy=None,
+        basedir=None,
+        in_memory=False,
+        quiet=False,
+        dispatch_shards=0,
+        shared_session=False,
+    ):
         self.accounts = accounts
         self.proxy = proxy
+        self.dispatch_shards = dispatch_shards
+        self.shared_session = shared_session
         self.basedir = basedir or user_data_dir(__product__)
         self.phones = []
         self.done = asyncio.Queue()
@@ -947,11 +2071,41 @@ class ClientsSession:
         if not self.watch:
             self.__class__.watch = asyncio.create_task(self.watchdog())
 
+    @classmethod
+    async def wait_flood(cls):
+        """等待账号间共享的登录频率限制解除."""
+        while True:
+            delay = cls.flood_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    async def start_client(client: Client, timeout: float):
+        """启动客户端, 等待输入验证码或密码的时间不计入超时."""
+        task = asyncio.ensure_future(client.start())
+        try:
+            while not task.done():
+                start = time.monotonic()
+                await asyncio.wait({task}, timeout=1)
+                if not client.prompting:
+                    timeout -= time.monotonic() - start
+                if timeout <= 0 and not task.done():
+                    raise asyncio.TimeoutError()
+            return task.result()
+        finally:
+            if not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
     async def test_network(self, proxy=None):
         url = "https://www.gstatic.com/generate_204"
         proxy_str = get_proxy_str(proxy)
         try:
-            async with httpx.AsyncClient(http2=True, proxy=proxy_str) as client:
+            async with borrow(proxy=proxy_str) as client:
                 resp = await client.get(url)
                 if resp.status_code == 204:
                     return True
@@ -976,7 +2130,7 @@ class ClientsSession:
         url = "https://ip.ddnspod.com/timestamp"
         proxy_str = get_proxy_str(proxy)
         try:
-            async with httpx.AsyncClient(http2=True, proxy=proxy_str) as client:
+            async with borrow(proxy=proxy_str) as client:
                 resp = await client.get(url)
                 if resp.status_code == 200:
                     timestamp = int(resp.content.decode())
@@ -1072,6 +2226,7 @@ class ClientsSession:
             if not self.quiet:
                 logger.info(f'登录至账号 "{account["phone"]}".')
             for _ in range(3):
+                await self.wait_flood()
                 if account.get("api_id", None) is None or account.get("api_hash", None) is None:
                     account.update(random.choice(list(API_KEY.values())))
                 config_session_string = session_string = account.get("session", None)
@@ -1084,7 +2239,11 @@ class ClientsSession:
                     in_memory = False
                 else:
                     in_memory = self.in_memory
-                if session_string or session_file.is_file():
+                if self.shared_session:
+                    session_exists = await SharedFileStorage.exists(Path(self.basedir), account["phone"])
+                else:
+                    session_exists = session_file.is_file()
+                if session_string or session_exists:
                     logger.debug(
                         f'账号 "{account["phone"]}" 登录凭据存在, 仅内存模式{"启用" if in_memory else "禁用"}.'
                     )
@@ -1094,9 +2253,10 @@ class ClientsSession:
                     )
                     if use_telethon:
                         logger.debug("选择使用 Telethon 进行首次登陆, 并转发字符串至 Pyrogram.")
-                        file_session_string = session_string = await self.get_session_string_from_telethon(
-                            account, proxy
-                        )
+                        async with self.interactive_lock:
+                            file_session_string = session_string = (
+                                await self.get_session_string_from_telethon(account, proxy)
+                            )
                         if session_string:
                             logger.info("请耐心等待, 正在登陆.")
                             await asyncio.sleep(10)
@@ -1118,9 +2278,12 @@ class ClientsSession:
                         workdir=self.basedir,
                         sleep_threshold=30,
                         workers=64,
+                        dispatch_shards=self.dispatch_shards,
+                        shared_session=self.shared_session,
                     )
                     try:
-                        await asyncio.wait_for(client.start(), 20)
+                        with profiling.phase(f"connect {index}"):
+                            await self.start_client(client, 20)
                     except asyncio.TimeoutError:
                         if proxy:
                             logger.error(f"无法连接到 Telegram 服务器, 请检查您代理的可用性.")
@@ -1131,7 +2294,20 @@ class ClientsSession:
                 except OperationalError as e:
                     logger.warning(f"内部数据库错误, 正在重置, 您可能需要重新登录.")
                     show_exception(e)
-                    session_file.unlink(missing_ok=True)
+                    if self.shared_session:
+                        await client.storage.delete()
+                    else:
+                        session_file.unlink(missing_ok=True)
+                except FloodWait as e:
+                    if e.value > self.flood_max:
+                        logger.error(
+                            f'登录账号 "{account["phone"]}" 时 Telegram 要求等待 {e.value} 秒, 将被跳过.'
+                        )
+                        return None
+                    logger.warning(
+                        f'登录账号 "{account["phone"]}" 时 Telegram 要求等待 {e.value} 秒, 所有账号将在等待后继续登录.'
+                    )
+                    ClientsSession.flood_until = max(ClientsSession.flood_until, time.monotonic() + e.value)
                 except ApiIdPublishedFlood:
                     logger.warning(f'登录账号 "{account["phone"]}" 时发生 API key 限制, 将被跳过.')
                     break
@@ -1198,10 +2374,19 @@ class ClientsSession:
             return client
 
     async def loginer(self, index, account):
-        client = await self.login(index, account, proxy=self.proxy)
+        phone = "".join(account["phone"].split())
+        if not self.login_semaphore:
+            ClientsSession.login_semaphore = asyncio.Semaphore(self.login_concurrent)
+        start = time.perf_counter()
+        async with self.login_semaphore:
+            waited = time.perf_counter() - start
+            with profiling.phase(f"login {index}"):
+                client = await self.login(index, account, proxy=self.proxy)
         if isinstance(client, Client):
+            logger.debug(
+                f'账号 "{phone}" 登录耗时 {time.perf_counter() - start:.1f} 秒 (其中排队 {waited:.1f} 秒).'
+            )
             async with self.lock:
-                phone = account["phone"]
                 self.pool[phone] = (client, 1)
                 self.phones.append(phone)
                 await self.done.put(client)
@@ -1209,21 +2394,40 @@ class ClientsSession:
         else:
             await self.done.put(None)
 
+    async def follower(self, phone, task: asyncio.Task):
+        """等待其他会话中正在进行的登录完成, 并共享登录的账号."""
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+        async with self.lock:
+            entry = self.pool.get(phone, None)
+            if isinstance(entry, tuple):
+                client, ref = entry
+                ref += 1
+                self.pool[phone] = (client, ref)
+                self.phones.append(phone)
+                await self.done.put(client)
+                logger.debug(f"Telegram 账号池计数增加: {phone} => {ref}")
+            else:
+                await self.done.put(None)
+
     async def __aenter__(self):
-        await self.test_network(self.proxy)
+        async def test_network():
+            with profiling.phase("network"):
+                await self.test_network(self.proxy)
+
+        asyncio.create_task(test_network())
         asyncio.create_task(self.test_time(self.proxy))
-        for i, a in enumerate(self.accounts):
-            phone = a["phone"].replace(" ", "")
-            try:
-                await self.lock.acquire()
-                if phone in self.pool:
-                    if isinstance(self.pool[phone], asyncio.Task):
-                        self.lock.release()
-                        await self.pool[phone]
-                        await self.lock.acquire()
-                    if isinstance(self.pool[phone], asyncio.Task):
-                        continue
-                    client, ref = self.pool[phone]
+        async with self.lock:
+            for i, a in enumerate(self.accounts):
+                phone = "".join(a["phone"].split())
+                entry = self.pool.get(phone, None)
+                if isinstance(entry, asyncio.Task) and not entry.done():
+                    asyncio.create_task(self.follower(phone, entry))
+                elif isinstance(entry, tuple):
+                    client, ref = entry
                     ref += 1
                     self.pool[phone] = (client, ref)
                     self.phones.append(phone)
@@ -1231,11 +2435,6 @@ class ClientsSession:
                     logger.debug(f"Telegram 账号池计数增加: {phone} => {ref}")
                 else:
                     self.pool[phone] = asyncio.create_task(self.loginer(i, a))
-            finally:
-                try:
-                    self.lock.release()
-                except RuntimeError:
-                    pass
         return self
 
     def __aiter__(self):
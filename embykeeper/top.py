@@ -40,12 +40,20 @@ async def topper():
                         qsize = client.dispatcher.updates_queue.qsize()
                         tasks = client.dispatcher.handler_worker_tasks
                         active = sum(1 for t in tasks if t.get_coro().cr_await.__name__ != "get")
+                        # 分片模式下显示积压最多的会话及其分片的平滑耗时
+                        hot = ""
+                        shards = client.dispatcher.get_shard_stats()
+                        if shards:
+                            qsize += sum(s[1] for s in shards)
+                            _, _, chat_id, depth, latency = max(shards, key=lambda s: s[3])
+                            if depth > 0:
+                                hot = f" {chat_id}:{depth}@{latency * 1000:.0f}ms"
                         if qsize > 0 or active > 0:
                             # 当队列超过10或handler使用率超过80%时显示红色
                             if qsize >= 10 or (active / len(tasks) >= 0.8):
-                                queue_stats.append(f"[red][{qsize}:{active}/{len(tasks)}][/red]")
+                                queue_stats.append(f"[red][{qsize}:{active}/{len(tasks)}{hot}][/red]")
                             else:
-                                queue_stats.append(f"[{qsize}:{active}/{len(tasks)}]")
+                                queue_stats.append(f"[{qsize}:{active}/{len(tasks)}{hot}]")
                     except:
                         queue_stats.append("[Error]")
 
@@ -58,7 +66,15 @@ async def topper():
         if not children:
             return None
         total_mem = sum(p.memory_info().rss for p in children) / 1024 / 1024
-        return f"OCR: {len(children)} ({total_mem:.1f} MB)"
+        text = f"OCR: {len(children)} ({total_mem:.1f} MB)"
+        # 显示已完成识别数量和平均排队等待时间
+        from .ocr import OCRCache, OCRService
+
+        if OCRService.processed_count > 0:
+            text += f" Done: {OCRService.processed_count} Wait: {OCRService.wait_time * 1000:.0f}ms"
+        if OCRCache.hits > 0:
+            text += f" Cache: {OCRCache.hits}/{OCRCache.hits + OCRCache.misses}"
+        return text
 
     def get_stats():
         # 创建状态表格
@@ -80,7 +96,7 @@ async def topper():
 
         # Client状态
         if tele_used:
-            from .telechecker.tele import ClientsSession, Dispatcher
+            from .telechecker.tele import ClientsSession, Dispatcher, LookupCache
             from .telechecker.link import Link
 
             pending, using, idle, queue_text = get_client_stats(ClientsSession.pool)
@@ -94,11 +110,35 @@ async def topper():
             if client_stats:
                 sys_stats.append((f"Tele: {'/'.join(client_stats)}{queue_text}", "bright_blue"))
 
-            if Link.post_count > 0:
-                sys_stats.append((f"Link: {Link.post_count}", "bright_blue"))
+            if Link.request_count > 0:
+                link_text = f"Link: {Link.post_count} (Total: {Link.request_count}"
+                if Link.timeout_count > 0:
+                    link_text += f", Timeout: {Link.timeout_count}"
+                link_text += f", {Link.latency * 1000:.0f}ms)"
+                sys_stats.append((link_text, "bright_blue"))
 
             if Dispatcher.updates_count > 0:
-                sys_stats.append((f"Updates: {Dispatcher.updates_count}", "bright_blue"))
+                updates_text = f"Updates: {Dispatcher.updates_count}"
+                if Dispatcher.skipped_count > 0:
+                    updates_text += f" (Skipped: {Dispatcher.skipped_count})"
+                sys_stats.append((updates_text, "bright_blue"))
+
+            lookups = LookupCache.hits + LookupCache.coalesced + LookupCache.requests
+            if lookups > 0:
+                saved = LookupCache.hits + LookupCache.coalesced
+                sys_stats.append((f"Lookup: {lookups} (Saved: {saved}/{lookups})", "bright_blue"))
+
+        # 共享 HTTP 客户端状态
+        from .http import HTTPPool
+
+        if HTTPPool.borrow_count > 0:
+            sys_stats.append(
+                (
+                    f"HTTP: {len(HTTPPool.clients)} ({HTTPPool.connections()} Conn, "
+                    f"Reuse: {HTTPPool.borrow_count - HTTPPool.created_count}/{HTTPPool.borrow_count})",
+                    "bright_blue",
+                )
+            )
 
         if emby_used:
             from .embywatcher.emby import Connector
@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+
+from embykeeper.http import HTTPPool
+
+
+def test_http_pool(monkeypatch):
+    monkeypatch.setattr(HTTPPool, "clients", {})
+    monkeypatch.setattr(HTTPPool, "evictors", {})
+    monkeypatch.setattr(HTTPPool, "idle_timeout", 0.05)
+
+    async def main():
+        async with HTTPPool.borrow(follow_redirects=True) as c1:
+            async with HTTPPool.borrow(follow_redirects=True) as c2:
+                assert c1 is c2
+            async with HTTPPool.borrow(verify=False) as c3:
+                assert c3 is not c1
+            await asyncio.sleep(0.15)
+            assert not c1.is_closed
+        assert c3.is_closed
+        await asyncio.sleep(0.1)
+        assert c1.is_closed and not HTTPPool.clients
+        async with HTTPPool.borrow() as c4:
+            pass
+        await HTTPPool.close()
+        assert c4.is_closed
+
+    asyncio.run(main())
+
+
+def test_http_pool_cookies(monkeypatch):
+    monkeypatch.setattr(HTTPPool, "clients", {})
+    monkeypatch.setattr(HTTPPool, "evictors", {})
+
+    def handler(request: httpx.Request):
+        return httpx.Response(
+            200, headers={"Set-Cookie": "sid=1; Path=/"}, text=request.headers.get("Cookie", "")
+        )
+
+    async def main():
+        async with HTTPPool.borrow() as client:
+            client._transport = httpx.MockTransport(handler)
+            await client.get("http://example.com/login")
+            assert (await client.get("http://example.com/")).text == ""
+            assert not client.cookies
+        await HTTPPool.close()
+
+    asyncio.run(main())
@@ -0,0 +1,27 @@
+import random
+
+from embykeeper.telechecker.keywords import KeywordMatcher, compile_patterns
+
+
+def test_keyword_matcher():
+    keywords = {"a": ["he", "she"], "b": ["his", "hers"], "c": ["成功"], "d": ["已经", "经过"]}
+    matcher = KeywordMatcher(keywords)
+    assert matcher.classify("ushers") == "a"
+    assert matcher.categories("ushers") == {"a", "b"}
+    assert matcher.classify("ahishe") == "a"
+    assert matcher.classify("hi") is None
+    assert matcher.classify("已经过了") == "d"
+    assert matcher.classify("签到成功, 已经...") == "c"
+
+    rng = random.Random(0)
+    for _ in range(500):
+        text = "".join(rng.choice("hesir成功已经过") for _ in range(rng.randint(0, 12)))
+        expected = {c for c, ws in keywords.items() if any(w in text for w in ws)}
+        assert matcher.categories(text) == expected, text
+
+
+def test_compile_patterns():
+    pattern = compile_patterns(("脚本", r"ban\b"))
+    assert pattern.search("不要 ban 我").group(0) == "ban"
+    assert not pattern.search("banana")
+    assert compile_patterns(("脚本", r"ban\b")) is pattern
@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+
+from pyrogram import ContinuePropagation
+from pyrogram.types import Message
+import pytest
+
+from embykeeper.telechecker import lock
+from embykeeper.telechecker.link import AuthCache, Link, LinkChannel, LinkDeniedError
+
+
+def test_auth_cache(tmp_path, monkeypatch):
+    posts = []
+
+    async def post(self, cmd, **kw):
+        posts.append(cmd)
+        if cmd.startswith("/auth prime"):
+            raise LinkDeniedError("权限不足.")
+        return {"status": "ok"}
+
+    monkeypatch.setattr(Link, "post", post)
+    monkeypatch.setattr(Link, "_show_super_ad", lambda self: asyncio.sleep(0))
+
+    async def main():
+        client = SimpleNamespace(me=SimpleNamespace(id=1, name="test"), workdir=tmp_path)
+        link = Link(client)
+        assert await link.auth_batch(["checkiner", "prime", "checkiner"]) == {
+            "checkiner": True,
+            "prime": False,
+        }
+        logs = []
+        assert await link.auth("prime", log_func=logs.append) is False
+        assert await link.auth("prime", log_func=logs.append) is False
+        assert logs == ["初始化错误: 使用 PRIME 服务, 但权限不足."]
+        assert len(posts) == 2
+
+        lock.authed_services.clear()
+        AuthCache._caches.clear()
+        assert await Link(client).auth("checkiner") is True
+        assert await Link(client).auth("prime", log_func=logs.append) is False
+        assert len(posts) == 2 and len(logs) == 2
+
+        lock.authed_services.clear()
+        AuthCache._caches.clear()
+        monkeypatch.setattr(AuthCache, "fail_ttl", 0)
+        assert await Link(client).auth("prime") is False
+        assert len(posts) == 3
+
+    try:
+        asyncio.run(main())
+    finally:
+        lock.authed_services.clear()
+        lock.authed_errors.clear()
+        lock.authed_services_locks.clear()
+        AuthCache._caches.clear()
+
+
+def test_link_channel_propagation(monkeypatch):
+    monkeypatch.setattr(LinkChannel, "_delete_later", lambda self, message: asyncio.sleep(0))
+
+    async def main():
+        channel = LinkChannel(SimpleNamespace(me=SimpleNamespace(id=1, name="test")))
+        future = channel.wait("/auth")
+        for text in ("not toml {", 'command = "/other"', 'command = "/auth"\nstatus = "ok"'):
+            with pytest.raises(ContinuePropagation):
+                await channel._handler(None, Message(id=1, text=text))
+        assert future.result() == {"command": "/auth", "status": "ok"}
+
+    asyncio.run(main())
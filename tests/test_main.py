@@ -0,0 +1,52 @@
+from importlib import import_module
+
+from embykeeper.telechecker.main import (
+    PLUGIN_ATTRS,
+    extract,
+    get_cls,
+    get_names,
+    get_registry,
+    get_site_attrs,
+    scan_plugin,
+)
+
+
+def test_scan_plugin(tmp_path):
+    file = tmp_path / "plugin.py"
+    file.write_text(
+        "from ._base import y\n"
+        "__ignore__ = True\n"
+        "class FooCheckin(y):\n"
+        "    name = 'Foo'\n"
+        "    bot_username = 'foo_bot'\n"
+        "    ocr: str = 'digit5@v1'\n"
+        "    bot_captcha_len = 4\n"
+        "    chat_name = get_name()\n"
+        "    class Inner(y):\n"
+        "        additional_auth = ['prime']\n"
+    )
+    result = scan_plugin(file)
+    assert result["ignore"] == True
+    assert result["imports"] == {"y": ["_base", "y"]}
+    (foo,) = result["classes"]
+    assert foo["bases"] == ["y"]
+    assert foo["attrs"] == {"bot_username": "foo_bot", "ocr": "digit5@v1"}
+    assert foo["dynamic"] == ["chat_name"]
+    assert foo["nested"][0]["attrs"] == {"additional_auth": ["prime"]}
+    file.write_text("__ignore__ = get_flag()\n")
+    assert scan_plugin(file)["ignore"] == False
+
+
+def test_registry_matches_modules():
+    registry = get_registry("monitor")
+    for name in get_names("monitor", allow_ignore=True):
+        module = import_module(f"embykeeper.telechecker.monitor.{name}")
+        assert registry[name]["ignore"] == getattr(module, "__ignore__", False)
+
+
+def test_site_attrs_match_classes():
+    for type in ("checkiner", "monitor"):
+        names = get_names(type)
+        expected = [{a: getattr(c, a, None) for a in PLUGIN_ATTRS} for c in extract(get_cls(type, names))]
+        expected = [{a: list(v) if isinstance(v, tuple) else v for a, v in e.items()} for e in expected]
+        assert [{a: s.get(a, None) for a in PLUGIN_ATTRS} for s in get_site_attrs(type, names)] == expected
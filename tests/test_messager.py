@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from loguru import logger
+
+from embykeeper.telechecker.messager._smart import SmartMessager
+
+
+def make_message(id, text, reply_to=None, outgoing=False):
+    return SimpleNamespace(
+        id=id,
+        text=text,
+        caption=None,
+        date=datetime(2024, 1, 1),
+        photo=None,
+        reply_to_message_id=reply_to,
+        outgoing=outgoing,
+        from_user=SimpleNamespace(name=f"user{id}"),
+        empty=False,
+    )
+
+
+def test_infer_prompt_history(monkeypatch):
+    monkeypatch.setattr(SmartMessager, "history", {})
+    monkeypatch.setattr(SmartMessager, "replies", {})
+    chat = [make_message(1, "old")]
+    chat += [make_message(i, f"msg{i}", reply_to=None if i % 2 else i - 1) for i in range(2, 12)]
+    calls = []
+
+    class FakeClient:
+        me = SimpleNamespace(id=1, name="me")
+
+        async def get_chat(self, name):
+            return SimpleNamespace(id=-100)
+
+        async def get_chat_history(self, chat_id, limit=0, min_id=0):
+            calls.append(("history", min_id))
+            for msg in reversed(chat[-limit:]):
+                if msg.id > min_id:
+                    yield msg
+
+        async def get_messages(self, chat_id, ids, replies=1):
+            calls.append(("messages", ids))
+            return [chat[0]]
+
+    messager = SmartMessager.__new__(SmartMessager)
+    messager.config = {}
+    messager.example_messages = []
+    messager.history_limit = 10
+    messager.chat_name = "test"
+
+    async def main():
+        tg = FakeClient()
+        prompt = await messager.get_infer_prompt(tg, logger)
+        assert "回复了消息: old" in prompt and "回复了消息: msg3" in prompt
+        assert calls == [("history", 0), ("messages", [1])]
+
+        chat.append(make_message(12, "msg12", reply_to=1))
+        prompt = await messager.get_infer_prompt(tg, logger)
+        assert "msg12" in prompt and "回复了消息: old" in prompt
+        assert calls[2:] == [("history", 11)]
+
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import asyncio
+
+from embykeeper.telechecker.monitor.pornemby_answer import QuestionBank
+
+
+def test_question_bank(tmp_path):
+    async def main():
+        bank = QuestionBank(tmp_path)
+        await bank.add([("以下哪部是 ABC-123?", "甲", "乙", "丙", "丁", "B")])
+        await bank.add(
+            [("以下哪部是 ABC-123？ ", "甲", "乙", "丙", "丁", "C"), ("Q2", "1", "2", "3", "4", "A")]
+        )
+        assert await bank.count() == 2
+        assert await bank.get("以下哪部是 ABC-123? (From资料库:第12题)") == "C"
+        assert await bank.get("以下哪部是 ABC-123?", "A:丙\nB:甲\nC:乙\nD:丁") == "A"
+        assert await bank.get("Q3") is None
+        await bank.add([("1+1=?", "0", "1", "2", "3", "C"), ("1-1=?", "0", "1", "2", "3", "A")])
+        assert await bank.get("1+1=?") == "C" and await bank.get("1-1=?") == "A"
+
+        csv = tmp_path / "legacy.csv"
+        csv.write_text("Question,A,B,C,D,Answer\nQ3,x,y,z,w,D\n", encoding="utf-8")
+        timestamp = tmp_path / "legacy.timestamp"
+        timestamp.write_text("100.0")
+        assert await bank.import_csv(csv, timestamp) == 1
+        assert await bank.get("Q3") == "D"
+        assert await bank.get_updated() == 100.0
+
+    asyncio.run(main())
+
+
+def test_alert_state():
+    from embykeeper.telechecker.lock import AlertState
+
+    async def main():
+        state = AlertState()
+        changes = []
+        state.listeners.append(changes.append)
+        assert not state
+        assert state.set(0.05)
+        assert state and changes == [True]
+        assert not state.set(0.01)
+        assert state.set(0.1)
+        await asyncio.sleep(0.07)
+        assert state and changes == [True]
+        await asyncio.sleep(0.05)
+        assert not state and changes == [True, False]
+        assert state.set() and state.set(10) is False
+        assert state.remaining == float("inf") and changes == [True, False, True]
+
+    asyncio.run(main())
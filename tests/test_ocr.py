@@ -0,0 +1,62 @@
+import asyncio
+from io import BytesIO
+from types import SimpleNamespace
+
+from embykeeper.ocr import CharRange, OCRCache, OCRService, OCRWorker
+
+
+def test_ocr_cache(tmp_path):
+    async def main():
+        key = OCRCache.key(b"image", "model", CharRange.NUMBER)
+        assert key != OCRCache.key(b"image", "model", None)
+        assert key != OCRCache.key(b"image", None, CharRange.NUMBER)
+
+        cache = OCRCache(tmp_path)
+        hits, misses = OCRCache.hits, OCRCache.misses
+        assert await cache.get(key) is None
+        await cache.set(key, "1234")
+        assert await cache.get(key) == "1234"
+        assert (OCRCache.hits - hits, OCRCache.misses - misses) == (1, 1)
+        await cache.close()
+
+        cache = OCRCache(tmp_path)
+        assert await cache.get(key) == "1234"
+        await cache.close()
+
+        cache = OCRCache(tmp_path, ttl=-1)
+        assert await cache.get(key) is None
+        await cache.close()
+
+    asyncio.run(main())
+
+
+def test_ocr_service_cache_hit(tmp_path):
+    async def main():
+        ocr = OCRService("model", basedir=tmp_path)
+        recognized = []
+
+        async def recognize(image_data, timeout=60):
+            recognized.append(image_data.getvalue())
+            return "abcd"
+
+        ocr._recognize = recognize
+        assert await ocr.run(BytesIO(b"captcha")) == "abcd"
+        assert await ocr.run(BytesIO(b"captcha")) == "abcd"
+        assert recognized == [b"captcha"]
+        await ocr._cache.close()
+
+    asyncio.run(main())
+
+
+def test_ocr_select_skips_dead_workers(monkeypatch):
+    ocr = OCRService("model")
+    dead = OCRWorker(SimpleNamespace(is_alive=lambda: False), None)
+    busy = OCRWorker(SimpleNamespace(is_alive=lambda: True), None)
+    busy.requests.add(1)
+    ocr._workers = [dead, busy]
+    spawned = []
+    monkeypatch.setattr(ocr, "_spawn", lambda: spawned.append(1) or "new")
+    monkeypatch.setattr(OCRService, "workers", 1)
+    assert ocr._select() is busy
+    ocr._workers = [dead]
+    assert ocr._select() == "new" and len(spawned) == 1
@@ -0,0 +1,546 @@
+import asyncio
+from types import SimpleNamespace
+
+from cachetools import TTLCache
+import pytest
+from pyrogram import filters
+from pyrogram.handlers import MessageHandler, RawUpdateHandler
+
+from embykeeper.telechecker.tele import Dispatcher, HandlerTable
+
+
+def make_message(chat_id, chat_username=None, user_id=None, user_username=None):
+    from pyrogram import types
+
+    message = types.Message(id=1)
+    message.chat = types.Chat(id=chat_id, username=chat_username)
+    if user_id:
+        message.from_user = types.User(id=user_id, username=user_username)
+    return message
+
+
+def test_get_routes():
+    assert HandlerTable.get_routes(filters.all) is None
+    assert HandlerTable.get_routes(filters.chat("me")) is None
+    assert HandlerTable.get_routes(filters.all & filters.chat("@Group")) == {("chat", "group")}
+    assert HandlerTable.get_routes(filters.chat(1) & filters.user(2)) == {("chat", 1)}
+    assert HandlerTable.get_routes(filters.private & filters.user("bot")) == {("user", "bot")}
+    assert HandlerTable.get_routes(filters.chat(1) | filters.user(2)) == {("chat", 1), ("user", 2)}
+    assert HandlerTable.get_routes(filters.chat(1) | filters.text) is None
+    assert HandlerTable.get_routes(~filters.chat(1)) is None
+
+
+def test_get_candidates():
+    async def main():
+        dispatcher = Dispatcher(SimpleNamespace())
+
+        async def callback(client, message):
+            pass
+
+        h1 = MessageHandler(callback, filters.chat("group") & ~filters.outgoing)
+        h2 = MessageHandler(callback, filters.user(100) & filters.private)
+        h3 = MessageHandler(callback, filters.text)
+        h4 = RawUpdateHandler(callback)
+        h5 = MessageHandler(callback, filters.chat(-1001))
+        await dispatcher.add_handler(h1, 2000)
+        await dispatcher.add_handler(h2, 1000)
+        await dispatcher.add_handler(h3, 0)
+        await dispatcher.add_handler(h4, 3000)
+        await dispatcher.add_handler(h5, 1000)
+
+        handlers = lambda m: [h for _, _, h in dispatcher.table.get_candidates(m)]
+        assert handlers(make_message(-1001, "Group", 100)) == [h3, h2, h5, h1, h4]
+        assert handlers(make_message(-1002, "other", 101)) == [h3, h4]
+        assert handlers(None) == [h3, h2, h5, h1, h4]
+
+        await dispatcher.remove_handler(h2, 1000)
+        await dispatcher.remove_handler(h1, 2000)
+        assert handlers(make_message(-1001, "Group", 100)) == [h3, h5, h4]
+        assert ("chat", "group") not in dispatcher.table.routes
+        assert dispatcher.table.version == 7
+
+        table = dispatcher.table
+        await dispatcher.add_handler(h1, 2000)
+        assert dispatcher.table is not table
+        assert [h for _, _, h in table.ordered] == [h3, h5, h4]
+
+        with pytest.raises(ValueError):
+            await dispatcher.remove_handler(h2, 1000)
+
+    asyncio.run(main())
+
+
+def test_sharded_dispatch():
+    from pyrogram import raw
+
+    async def main():
+        client = SimpleNamespace(dispatch_shards=2, no_updates=False, skip_updates=True, workers=4)
+        dispatcher = Dispatcher(client)
+        results = []
+        blocked = asyncio.Event()
+
+        async def callback(client, update, users, chats):
+            if update.channel_id == 1 and not blocked.is_set():
+                await blocked.wait()
+            results.append((update.channel_id, update.pts))
+
+        await dispatcher.add_handler(RawUpdateHandler(callback), 0)
+        await dispatcher.start()
+        for pts in range(3):
+            dispatcher.updates_queue.put_nowait(
+                (raw.types.UpdateChannelTooLong(channel_id=1, pts=pts), {}, {})
+            )
+        dispatcher.updates_queue.put_nowait((raw.types.UpdateChannelTooLong(channel_id=2, pts=0), {}, {}))
+        await asyncio.sleep(0.1)
+        assert results == [(2, 0)]
+        assert [(s[2], s[3]) for s in dispatcher.get_shard_stats() if s[3]] == [(-1000000000001, 3)]
+        blocked.set()
+        await dispatcher.stop(clear=False)
+        assert results == [(2, 0), (1, 0), (1, 1), (1, 2)]
+        assert dispatcher.updates_queue.empty()
+
+        await dispatcher.start()
+        dispatcher.updates_queue.put_nowait((raw.types.UpdateChannelTooLong(channel_id=3, pts=0), {}, {}))
+        await asyncio.sleep(0.05)
+        assert results[-1] == (3, 0)
+        await dispatcher.stop()
+
+    asyncio.run(main())
+
+
+def test_raw_prefilter():
+    from pyrogram import raw
+
+    def make_update(channel_id, user_id, edit=False):
+        message = raw.types.Message(
+            id=1,
+            peer_id=raw.types.PeerChannel(channel_id=channel_id),
+            from_id=raw.types.PeerUser(user_id=user_id),
+            date=0,
+            message="hello",
+        )
+        if edit:
+            update = raw.types.UpdateEditChannelMessage(message=message, pts=1, pts_count=1)
+        else:
+            update = raw.types.UpdateNewChannelMessage(message=message, pts=1, pts_count=1)
+        chats = {
+            channel_id: raw.types.Channel(
+                id=channel_id,
+                title="G",
+                photo=raw.types.ChatPhotoEmpty(),
+                date=0,
+                username=f"Group{channel_id}",
+            )
+        }
+        users = {user_id: raw.types.User(id=user_id, username=f"Bob{user_id}")}
+        return update, users, chats
+
+    assert HandlerTable.get_raw_message_routes(*make_update(5, 7)) == [
+        ("chat", -1000000000005),
+        ("chat", "group5"),
+        ("user", 7),
+        ("user", "bob7"),
+    ]
+
+    async def main():
+        dispatcher = Dispatcher(SimpleNamespace())
+        parsed = []
+
+        async def parser(update, users, chats):
+            parsed.append(update)
+            return make_message(-1000000000005, "Group5", 7, "Bob7"), MessageHandler
+
+        async def callback(client, message):
+            message.continue_propagation()
+
+        for t in dispatcher.MESSAGE_UPDATES:
+            dispatcher.update_parsers[t] = parser
+        await dispatcher.add_handler(MessageHandler(callback, filters.chat("group5")), 1)
+        await dispatcher.add_handler(MessageHandler(callback, filters.user("bob7")), 2)
+
+        await dispatcher.handle_packet(make_update(6, 8))
+        await dispatcher.handle_packet(make_update(5, 7, edit=True))
+        assert not parsed
+        await dispatcher.handle_packet(make_update(5, 7))
+        assert len(parsed) == 1
+
+    asyncio.run(main())
+
+
+def test_update_state_buffer():
+    from embykeeper.telechecker.tele import UpdateStateBuffer
+
+    class Storage:
+        def __init__(self):
+            self.batches = []
+
+        async def update_states(self, values):
+            self.batches.append(sorted(values))
+
+    async def main():
+        storage = Storage()
+        buffer = UpdateStateBuffer(storage, interval=0.05)
+        buffer.put((-1001, 1, None, 10, 1))
+        buffer.put((-1001, 2, None, 11, 2))
+        buffer.put((0, 5, None, 11, 2))
+        assert not storage.batches
+        await asyncio.sleep(0.1)
+        assert storage.batches == [[(-1001, 2, None, 11, 2), (0, 5, None, 11, 2)]]
+
+        buffer.put((-1001, 3, None, 12, 3))
+        await buffer.flush()
+        assert storage.batches[-1] == [(-1001, 3, None, 12, 3)]
+        assert buffer.timer is None
+
+    asyncio.run(main())
+
+
+def test_shared_file_storage(tmp_path):
+    from embykeeper.telechecker.tele import SharedFileStorage
+
+    tmp_path = tmp_path / "data #1?%"
+    tmp_path.mkdir()
+
+    async def main():
+        s1 = SharedFileStorage("100", tmp_path)
+        s2 = SharedFileStorage("200", tmp_path)
+        await s1.open()
+        await s2.open()
+        assert s1.conn is s2.conn
+        await s1.user_id(1)
+        await s2.user_id(2)
+        await s1.update_peers([(-1001, 11, "channel", None)])
+        await s2.update_peers([(-1001, 22, "channel", None)])
+        await s1.update_usernames([(-1001, ["group"])])
+        await s1.update_states([(-1001, 5, None, 10, 1)])
+        assert (await s1.get_peer_by_id(-1001)).access_hash == 11
+        assert (await s2.get_peer_by_id(-1001)).access_hash == 22
+        assert (await s1.get_peer_by_username("group")).access_hash == 11
+        with pytest.raises(KeyError):
+            await s2.get_peer_by_username("group")
+        assert await s2.update_state() == []
+        await s1.close()
+        await s2.close()
+        assert not SharedFileStorage.connections
+        assert await SharedFileStorage.exists(tmp_path, "100") is False
+
+        s1 = SharedFileStorage("100", tmp_path)
+        await s1.open()
+        assert await s1.user_id() == 1
+        assert await s1.update_state() == [(-1001, 5, None, 10, 1)]
+        await s1.auth_key(bytes(256))
+        await s1.close()
+        assert await SharedFileStorage.exists(tmp_path, "100") is True
+
+        await s1.delete()
+        assert await SharedFileStorage.exists(tmp_path, "100") is False
+        assert not SharedFileStorage.connections
+
+    asyncio.run(main())
+
+
+def test_dialog_index():
+    from pyrogram import raw
+
+    from embykeeper.telechecker.tele import DialogIndex
+
+    def page(folder_id, ids, complete=False):
+        dialogs = [
+            raw.types.Dialog(
+                peer=raw.types.PeerUser(user_id=i),
+                top_message=i * 10,
+                read_inbox_max_id=0,
+                read_outbox_max_id=0,
+                unread_count=0,
+                unread_mentions_count=0,
+                unread_reactions_count=0,
+                notify_settings=raw.types.PeerNotifySettings(),
+                folder_id=folder_id or None,
+            )
+            for i in ids
+        ]
+        messages = [
+            raw.types.Message(id=i * 10, peer_id=raw.types.PeerUser(user_id=i), date=i, message="")
+            for i in ids
+        ]
+        if complete:
+            return raw.types.messages.Dialogs(dialogs=dialogs, messages=messages, chats=[], users=[])
+        return raw.types.messages.DialogsSlice(
+            count=0, dialogs=dialogs, messages=messages, chats=[], users=[]
+        )
+
+    pages = {0: [page(0, [1, 2]), page(0, [3])], 1: [page(1, [4], complete=True)]}
+    requests = []
+
+    async def invoke(query, sleep_threshold=None):
+        requests.append((query.folder_id, query.offset_id, query.offset_date))
+        if query.folder_id == 1:
+            # 建立期间收到归档会话的新消息
+            index.feed(raw.types.UpdateShortMessage(id=45, user_id=4, message="", pts=0, pts_count=0, date=0))
+        return pages[query.folder_id].pop(0)
+
+    async def resolve_peer(chat_id):
+        return raw.types.InputPeerUser(user_id=chat_id, access_hash=0)
+
+    index = DialogIndex(SimpleNamespace(invoke=invoke, resolve_peer=resolve_peer), limit=2)
+
+    async def main():
+        assert (await index.get(1)).top_message == 10
+        assert not (await index.get(3)).archived
+        assert await index.get(4) == (1, 45)
+        assert await index.get(5) is None
+        assert requests == [(0, 0, 0), (0, 20, 2), (1, 0, 0)]
+
+        index.feed(raw.types.UpdateShortMessage(id=50, user_id=5, message="", pts=0, pts_count=0, date=0))
+        index.feed(
+            raw.types.UpdateFolderPeers(
+                folder_peers=[raw.types.FolderPeer(peer=raw.types.PeerUser(user_id=1), folder_id=1)],
+                pts=0,
+                pts_count=0,
+            )
+        )
+        assert await index.get(5) == (0, 50)
+        assert await index.get(1) == (1, 10)
+        assert len(requests) == 3
+
+    asyncio.run(main())
+
+
+def test_clients_session_login(monkeypatch):
+    from embykeeper.telechecker.tele import Client, ClientsSession
+
+    running = []
+    peak = []
+
+    async def login(self, index, account, proxy):
+        running.append(account["phone"])
+        peak.append(len(running))
+        await asyncio.sleep(0.05)
+        running.remove(account["phone"])
+        client = Client.__new__(Client)
+        client.phone_number = account["phone"]
+        return client
+
+    async def noop(self, proxy=None):
+        pass
+
+    monkeypatch.setattr(ClientsSession, "login", login)
+    monkeypatch.setattr(ClientsSession, "test_network", noop)
+    monkeypatch.setattr(ClientsSession, "test_time", noop)
+    monkeypatch.setattr(ClientsSession, "watch", True)
+    monkeypatch.setattr(ClientsSession, "pool", {})
+    monkeypatch.setattr(ClientsSession, "login_concurrent", 2)
+    monkeypatch.setattr(ClientsSession, "login_semaphore", None)
+
+    async def main():
+        accounts = [{"phone": str(i)} for i in range(4)]
+        async with ClientsSession(accounts) as s1, ClientsSession(accounts[:2]) as s2:
+            assert sorted([c.phone_number async for c in s1]) == ["0", "1", "2", "3"]
+            assert sorted([c.phone_number async for c in s2]) == ["0", "1"]
+        assert max(peak) == 2 and len(peak) == 4
+        assert ClientsSession.pool["0"][1] == 0
+
+    asyncio.run(main())
+
+
+def test_clients_session_flood_wait(monkeypatch, tmp_path):
+    import time
+
+    from pyrogram.errors import FloodWait
+
+    from embykeeper.telechecker.tele import Client, ClientsSession
+
+    started = {}
+
+    async def send_code(self, phone_number):
+        raise FloodWait(value=1)
+
+    async def start(self):
+        if self.phone_number == "0" and "0" not in started:
+            started["0"] = None
+            await self.authorize()
+        await asyncio.sleep(0.05)
+        started[self.phone_number] = time.monotonic()
+
+    async def export_session_string(self):
+        return "session"
+
+    async def noop(self, proxy=None):
+        pass
+
+    monkeypatch.setattr(Client, "send_code", send_code)
+    monkeypatch.setattr(Client, "start", start)
+    monkeypatch.setattr(Client, "export_session_string", export_session_string)
+    monkeypatch.setattr(ClientsSession, "test_network", noop)
+    monkeypatch.setattr(ClientsSession, "test_time", noop)
+    monkeypatch.setattr(ClientsSession, "watch", True)
+    monkeypatch.setattr(ClientsSession, "pool", {})
+    monkeypatch.setattr(ClientsSession, "login_concurrent", 2)
+    monkeypatch.setattr(ClientsSession, "login_semaphore", None)
+    monkeypatch.setattr(ClientsSession, "flood_until", 0)
+
+    async def main():
+        accounts = [{"phone": str(i), "session": "session", "api_id": 1, "api_hash": "x"} for i in range(3)]
+        begin = time.monotonic()
+        async with ClientsSession(accounts, basedir=tmp_path, quiet=True) as session:
+            assert sorted([c.phone_number async for c in session]) == ["0", "1", "2"]
+        # 账号 1 在等待开始前已进入登录, 排队中的账号 2 和重试的账号 0 需等待
+        assert started["1"] - begin < 0.5
+        assert started["0"] - begin >= 0.9 and started["2"] - begin >= 0.9
+
+    asyncio.run(main())
+
+
+def test_start_client_pauses_timeout_while_prompting():
+    from embykeeper.telechecker.tele import ClientsSession
+
+    async def main():
+        client = SimpleNamespace(prompting=False)
+
+        async def start():
+            client.prompting = True
+            await asyncio.sleep(1.2)
+            client.prompting = False
+            return "started"
+
+        client.start = start
+        assert await ClientsSession.start_client(client, 0.5) == "started"
+
+        async def hang():
+            await asyncio.sleep(10)
+
+        client.start = hang
+        with pytest.raises(asyncio.TimeoutError):
+            await ClientsSession.start_client(client, 0.5)
+
+    asyncio.run(main())
+
+
+def test_chat_member_cache(monkeypatch):
+    from pyrogram import raw
+    from pyrogram.enums import ChatMemberStatus
+
+    from pyrogram.errors import ChatAdminRequired
+
+    from embykeeper.telechecker.tele import ChatMemberCache
+
+    monkeypatch.setattr(ChatMemberCache, "statuses", {})
+    monkeypatch.setattr(ChatMemberCache, "admins", {})
+    monkeypatch.setattr(ChatMemberCache, "admins_failed", {})
+    calls = []
+
+    async def get_chat_members(chat_id, filter=None):
+        calls.append(("admins", chat_id))
+        if chat_id == -200:
+            raise ChatAdminRequired()
+        await asyncio.sleep(0.01)
+        yield SimpleNamespace(user=SimpleNamespace(id=1), status=ChatMemberStatus.OWNER)
+
+    async def get_chat_member(chat_id, user_id):
+        calls.append(("member", chat_id, user_id))
+        return SimpleNamespace(status=ChatMemberStatus.MEMBER)
+
+    async def main():
+        client = SimpleNamespace(
+            me=SimpleNamespace(id=9), get_chat_members=get_chat_members, get_chat_member=get_chat_member
+        )
+        results = await asyncio.gather(*[ChatMemberCache.is_admin(client, -100, u) for u in (1, 2, 1, 3)])
+        assert results == [True, False, True, False]
+        assert calls == [("admins", -100)]
+        assert await ChatMemberCache.get_status(client, -100, 1) == ChatMemberStatus.OWNER
+        assert await ChatMemberCache.get_status(client, -100, 5) == ChatMemberStatus.MEMBER
+        assert await ChatMemberCache.get_status(client, -100, 5) == ChatMemberStatus.MEMBER
+        assert len(calls) == 2
+
+        ChatMemberCache.feed(
+            raw.types.UpdateChatParticipant(
+                chat_id=100,
+                date=0,
+                actor_id=1,
+                user_id=2,
+                qts=0,
+                new_participant=raw.types.ChatParticipantAdmin(user_id=2, inviter_id=1, date=0),
+            )
+        )
+        assert await ChatMemberCache.is_admin(client, -100, 2)
+        assert len(calls) == 2
+
+        # 账号自身的成员身份每次重新获取
+        await ChatMemberCache.get_status(client, -100, 9)
+        await ChatMemberCache.get_status(client, -100, 9)
+        assert calls[2:] == [("member", -100, 9)] * 2
+
+        # 无权获取管理员列表时, 失败结果在一段时间内不再重试
+        assert not await ChatMemberCache.is_admin(client, -200, 5)
+        assert not await ChatMemberCache.is_admin(client, -200, 6)
+        assert calls.count(("admins", -200)) == 1
+
+    asyncio.run(main())
+
+
+def test_lookup_cache():
+    from pyrogram import raw
+
+    from embykeeper.telechecker.tele import LookupCache
+
+    calls = []
+
+    async def get_chat(ident):
+        calls.append(ident)
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(id=-1000000000001, title=str(len(calls)))
+
+    async def main():
+        cache = LookupCache()
+        chats = await asyncio.gather(*[cache.get("chat", i, get_chat) for i in ("@Foo", "foo", "FOO")])
+        assert len(calls) == 1 and all(c is chats[0] for c in chats)
+        assert (await cache.get("chat", "foo", get_chat)).title == "1"
+        assert len(calls) == 1
+
+        cache.feed(raw.types.UpdateChannel(channel_id=1))
+        assert (await cache.get("chat", "foo", get_chat)).title == "2"
+        assert calls == ["@Foo", "foo"]
+        assert isinstance(cache.keys, TTLCache)
+
+    asyncio.run(main())
+
+
+def test_resolve_peer_lookup(monkeypatch):
+    import pyrogram
+    from pyrogram import raw
+
+    from embykeeper.telechecker.tele import Client, LookupCache
+
+    for name in ("hits", "coalesced", "requests"):
+        monkeypatch.setattr(LookupCache, name, 0)
+    resolved = []
+
+    async def resolve_peer(self, peer_id):
+        resolved.append(peer_id)
+        await asyncio.sleep(0.01)
+        return raw.types.InputPeerUser(user_id=1, access_hash=1)
+
+    async def get_peer_by_username(username):
+        if username == "stored_bot":
+            return raw.types.InputPeerUser(user_id=2, access_hash=2)
+        raise KeyError(username)
+
+    monkeypatch.setattr(pyrogram.Client, "resolve_peer", resolve_peer)
+
+    async def main():
+        client = Client("test", in_memory=True, api_id=1, api_hash="x")
+        client.storage = SimpleNamespace(get_peer_by_username=get_peer_by_username)
+        await client.resolve_peer(-1001)
+        await client.resolve_peer("me")
+        await client.resolve_peer("@Stored_Bot")
+        assert resolved == [-1001, "me"] and LookupCache.requests == 0
+        await asyncio.gather(*[client.resolve_peer(u) for u in ("@New_Bot", "new_bot", "NEW_BOT")])
+        await client.resolve_peer("new_bot")
+        assert resolved == [-1001, "me", "@New_Bot"]
+        assert (LookupCache.requests, LookupCache.coalesced, LookupCache.hits) == (1, 2, 1)
+
+        await client.handle_updates(raw.types.UpdateShort(update=raw.types.UpdateUser(user_id=1), date=0))
+        await client.resolve_peer("new_bot")
+        assert LookupCache.requests == 2
+
+    asyncio.run(main())